@@ -0,0 +1,50 @@
+# distanze comune-gemello: una chiamata a geopy per coppia contro geodistance vettoriale
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from geodistance import geodesic_km, haversine_km, vincenty_km
+from resultfiles import glob_result_files, iter_result_file
+
+file_pattern = os.path.join(ROOT, "results/result_*.jsonl")
+REPEAT = 3
+
+
+def load_pairs():
+    pairs = []
+    for filename in glob_result_files(file_pattern):
+        for comune in iter_result_file(filename):
+            if comune.lat is None or comune.lon is None:
+                continue
+            for gemello in comune.gemelli:
+                if gemello.lat is not None and gemello.lon is not None:
+                    pairs.append((comune.lat, comune.lon, gemello.lat, gemello.lon))
+    return tuple(np.array(column, dtype=float) for column in zip(*pairs))
+
+
+def timed(func, columns):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        km = func(*columns)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, km
+
+
+if __name__ == "__main__":
+    columns = load_pairs()
+    print(f"coppie: {len(columns[0])}")
+    reference_time, reference = timed(geodesic_km, columns)
+    print(f"geopy per riga: {reference_time * 1000:8.1f} ms")
+    for name, func in (("ellipsoidal", vincenty_km), ("haversine", haversine_km)):
+        elapsed, km = timed(func, columns)
+        error = np.abs(km - reference)
+        relative = error / np.maximum(reference, 1e-9)
+        print(f"{name:14} {elapsed * 1000:8.1f} ms ({reference_time / elapsed:6.1f}x)"
+              f"  errore max {error.max() * 1000:.6f} m, relativo max {relative.max():.2e}")
@@ -0,0 +1,55 @@
+# confronta parse completo e scansione veloce di parse_gemellaggi sul wikitext in cache/http.sqlite
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpcache
+from gemellaggi import parse_gemellaggi
+
+# pagine più grandi da confrontare e ripetizioni per pagina
+PAGES = 50
+REPEAT = 5
+
+
+def load_wikitexts(limit):
+    cache = httpcache.HttpCache(os.path.join(ROOT, httpcache.CACHE_PATH))
+    rows = cache.conn.execute("""SELECT key, body FROM responses WHERE key LIKE 'page:%'
+        ORDER BY size DESC LIMIT ?""", (limit,)).fetchall()
+    return [(key[len("page:"):], json.loads(zlib.decompress(body))) for key, body in rows]
+
+
+def timed(wikitext, fast):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        with contextlib.redirect_stdout(io.StringIO()):
+            gemelli = parse_gemellaggi(wikitext, fast=fast)
+    return (time.perf_counter() - start) / REPEAT, gemelli
+
+
+if __name__ == "__main__":
+    pages = load_wikitexts(PAGES)
+    if not pages:
+        sys.exit("nessun wikitext in cache: lancia prima python -m twinings crawl")
+
+    total_full = total_fast = 0
+    mismatches = []
+    print(f"{'pagina':<40}{'KB':>8}{'full ms':>10}{'fast ms':>10}")
+    for title, wikitext in pages:
+        full, gemelli_full = timed(wikitext, False)
+        fast, gemelli_fast = timed(wikitext, True)
+        total_full += full
+        total_fast += fast
+        if gemelli_full != gemelli_fast:
+            mismatches.append(title)
+        print(f"{title[:39]:<40}{len(wikitext) / 1024:>8.0f}{full * 1000:>10.2f}{fast * 1000:>10.2f}")
+
+    print("-" * 68)
+    print(f"totale full {total_full * 1000:.1f} ms, fast {total_fast * 1000:.1f} ms, speedup {total_full / max(total_fast, 1e-9):.1f}x")
+    print(f"risultati diversi: {len(mismatches)} {mismatches}")
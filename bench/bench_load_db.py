@@ -0,0 +1,89 @@
+# tempo di caricamento del db: loop originale (commit a ogni insert) contro dbload.load_db
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from geopy.distance import geodesic
+
+from dbload import create_tables, load_db
+from resultfiles import glob_result_files, iter_result_file
+
+file_pattern = os.path.join(ROOT, "results/result_*.jsonl")
+province_filename = os.path.join(ROOT, "results/province.json")
+
+
+LEGACY_COLUMNS = (
+    ("comuni", "id, comune, lat, log, stato, provincia, found_coords, found_claims"),
+    ("twins", "*"),
+    ("main_cities", "name"),
+)
+
+
+def legacy_load_db(conn):
+    # il caricamento come era in generate-db.py
+    c = conn.cursor()
+    create_tables(c)
+    conn.commit()
+    with open(province_filename, "r", encoding="utf-8") as f:
+        for provincia in json.load(f):
+            for main_city in provincia.get("nome").split("-"):
+                c.execute("INSERT INTO main_cities (name) VALUES(?)", (main_city.strip(),))
+                conn.commit()
+    for filename in glob_result_files(file_pattern):
+        for comune in iter_result_file(filename):
+            c.execute("""INSERT INTO comuni (comune, lat, log, stato, provincia, found_coords, found_claims)
+                VALUES(?, ?, ?, ?, ?, ?, ?)""", (comune.comune, comune.lat, comune.lon, comune.stato, comune.regione, comune.found_coords, comune.found_claims))
+            conn.commit()
+            id_comune = c.lastrowid
+            p1 = (comune.lat, comune.lon)
+            print(comune.comune)
+            for gemello in comune.gemelli:
+                distance = None
+                if gemello.lat is not None and gemello.lon is not None:
+                    distance = geodesic(p1, (gemello.lat, gemello.lon)).km
+                c.execute("""INSERT INTO twins (comune, idParent, lat, log, distance, stato, provincia, found_coords, found_claims)
+                    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)""", (gemello.comune, id_comune, gemello.lat, gemello.lon, distance, gemello.stato, gemello.regione, gemello.found_coords, gemello.found_claims))
+                conn.commit()
+
+
+def timed(loader, path):
+    conn = sqlite3.connect(path)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader(conn)
+    elapsed = time.perf_counter() - start
+    # solo le colonne che scrive anche il loop originale
+    dump = [conn.execute(f"SELECT {columns} FROM {table} ORDER BY rowid").fetchall() for table, columns in LEGACY_COLUMNS]
+    conn.close()
+    return elapsed, dump
+
+
+def same_rows(legacy_rows, bulk_rows, tolerance=1e-6):
+    # le distanze vettoriali differiscono da geodesic per meno di un millimetro
+    legacy_comuni, legacy_twins, legacy_cities = legacy_rows
+    bulk_comuni, bulk_twins, bulk_cities = bulk_rows
+    if legacy_comuni != bulk_comuni or legacy_cities != bulk_cities or len(legacy_twins) != len(bulk_twins):
+        return False
+    for a, b in zip(legacy_twins, bulk_twins):
+        if a[:5] != b[:5] or a[6:] != b[6:] or (a[5] is None) != (b[5] is None):
+            return False
+        if a[5] is not None and abs(a[5] - b[5]) > tolerance:
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy, legacy_rows = timed(legacy_load_db, os.path.join(tmp, "legacy.db"))
+        bulk, bulk_rows = timed(lambda conn: load_db(conn, file_pattern, province_filename), os.path.join(tmp, "bulk.db"))
+    print(f"loop originale: {legacy:.2f} s")
+    print(f"load_db:        {bulk:.2f} s ({legacy / bulk:.1f}x)")
+    print(f"stesse righe:   {same_rows(legacy_rows, bulk_rows)}")
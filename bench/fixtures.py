@@ -0,0 +1,126 @@
+# risposte MediaWiki/Wikidata registrate una volta e servite di nuovo alla sessione di wikiclient, senza rete
+import gzip
+import json
+import os
+import sys
+import threading
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpcache
+import wikiclient
+
+FIXTURES_PATH = os.path.join(ROOT, "bench/fixtures/api.jsonl.gz")
+# aggiunto da get_json a ogni richiesta, non fa parte della chiave
+IGNORED_PARAMS = ("maxlag",)
+
+
+def split_request(url):
+    # stessa chiave di httpcache: url senza query + parametri
+    parts = urlsplit(url)
+    params = {k: v for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in IGNORED_PARAMS}
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")), params
+
+
+class FixtureStore:
+    # un file JSONL compresso: una riga "meta" e poi una riga per risposta {"url", "params", "body"}
+    def __init__(self, path=FIXTURES_PATH):
+        self.path = path
+        self.meta = {}
+        self.responses = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if "meta" in entry:
+                    self.meta = entry["meta"]
+                else:
+                    self.responses[httpcache.request_key(entry["url"], entry["params"])] = entry
+        return self
+
+    def get(self, url, params):
+        return self.responses.get(httpcache.request_key(url, params))
+
+    def put(self, url, params, body):
+        with self.lock:
+            self.responses[httpcache.request_key(url, params)] = {"url": url, "params": params, "body": body}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with gzip.open(self.path + ".tmp", "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"meta": self.meta}, ensure_ascii=False) + "\n")
+            for entry in self.responses.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(self.path + ".tmp", self.path)
+
+    def iter_wikitexts(self):
+        # (titolo, wikitext) delle pagine scaricate per revids
+        for entry in self.responses.values():
+            for page in entry["body"].get("query", {}).get("pages", []):
+                if isinstance(page, dict) and page.get("revisions"):
+                    yield page["title"], page["revisions"][0]["slots"]["main"]["content"]
+
+
+def make_response(request, body):
+    # risposta JSON per la sessione requests, 404 se body è None
+    response = requests.Response()
+    response.request = request
+    response.url = request.url
+    response.status_code = 200 if body is not None else 404
+    response.reason = "OK" if body is not None else "fixture mancante"
+    response.headers["Content-Type"] = "application/json; charset=utf-8"
+    response._content = json.dumps(body if body is not None else {}).encode("utf-8")
+    response.encoding = "utf-8"
+    return response
+
+
+class FixtureAdapter(BaseAdapter):
+    # trasporto della sessione requests: risponde dal FixtureStore, 404 per le richieste non registrate
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+
+    def send(self, request, **kwargs):
+        url, params = split_request(request.url)
+        entry = self.store.get(url, params)
+        return make_response(request, entry["body"] if entry else None)
+
+    def close(self):
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    # va in rete come HTTPAdapter e salva nel FixtureStore ogni risposta valida
+    def __init__(self, store, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            body = response.json()
+            if "error" not in body:
+                url, params = split_request(request.url)
+                self.store.put(url, params, body)
+        return response
+
+
+def install(adapter):
+    # sostituisce il trasporto della sessione condivisa di wikiclient; niente cache su disco, ogni richiesta passa dall'adapter
+    httpcache.ENABLED = False
+    session = wikiclient.get_session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def lift_limits():
+    # nessun limite di velocità per host: si misura il codice, non il rate limit di Wikipedia
+    for host in list(wikiclient.HOST_LIMITS):
+        wikiclient.configure_host(host, rate=1e9, burst=1e9)
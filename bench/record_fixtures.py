@@ -0,0 +1,35 @@
+# registra in bench/fixtures/api.jsonl.gz le risposte di un crawl vero dei primi N comuni di una lettera
+import argparse
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import crawler
+import resolved
+from fixtures import FIXTURES_PATH, FixtureStore, RecordingAdapter, install
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="registra le fixture per run_bench.py (richiede la rete)")
+    parser.add_argument("lettera", nargs="?", default="A")
+    parser.add_argument("-n", "--comuni", type=int, default=100, help="quanti comuni della lettera")
+    parser.add_argument("-o", "--output", default=FIXTURES_PATH)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    store = FixtureStore(os.path.abspath(args.output))
+    install(RecordingAdapter(store, pool_maxsize=crawler.WORKERS))
+    # come in run_bench.py: senza memo dei gemelli risolti, ogni richiesta del crawl finisce nelle fixture
+    resolved.ENABLED = False
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        comuni = [{"comune": c, "stato": "Italia"} for c in crawler.get_comuni_lettera(args.lettera)[:args.comuni]]
+        records = crawler.search_comune_list(comuni, True)
+    store.meta = {"lettera": args.lettera, "comuni": len(comuni)}
+    store.save()
+    print(f"{store.path}: {len(store.responses)} risposte, {len(records)} comuni")
@@ -0,0 +1,205 @@
+# benchmark offline di tutta la pipeline: crawl dalle fixture registrate, parse dei template, db, report ed export CSV
+# i risultati vanno in un JSON (uno per commit) da confrontare con --compare
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import crawler
+import metrics
+import resolved
+from csvexport import export_csv, iter_rows_from_results
+from dbload import load_db
+from fixtures import FIXTURES_PATH, FixtureAdapter, FixtureStore, install, lift_limits
+from gemellaggi import link_target, parse_gemellaggi
+from reports import REPORTS, TEMP_REPORTS, run_reports
+from resultfiles import get_result_path, iter_result_file
+
+file_pattern = os.path.join(ROOT, "results/result_*.jsonl")
+province_filename = os.path.join(ROOT, "results/province.json")
+RESULTS_DIR = os.path.join(ROOT, "bench/results")
+REPEAT = 3
+BENCHMARKS = ("crawl", "parse", "parse-full", "load-db", "reports", "export-csv")
+
+
+@contextlib.contextmanager
+def workdir():
+    # ogni misura in una cartella vuota: cache/, journal/ e db non passano da una ripetizione all'altra
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(cwd)
+
+
+def get_crawl_key(comune):
+    # dati confrontati con i result committati: senza QID (quelli sintetici sono inventati), gemelli per titolo della pagina
+    twins = [(link_target(g.comune), g.lat, g.lon, g.stato, g.regione, g.found_coords, g.found_claims) for g in comune.gemelli]
+    return comune.comune, comune.lat, comune.lon, comune.stato, comune.regione, comune.found_coords, comune.found_claims, twins
+
+
+def get_crawl_mismatches(lettera, records):
+    # comuni del crawl diversi da results/result_<lettera>.jsonl
+    expected = {c.comune: get_crawl_key(c) for c in iter_result_file(get_result_path(lettera, os.path.join(ROOT, "results")))}
+    return [c.comune for c in records if get_crawl_key(c) != expected.get(c.comune)]
+
+
+def bench_crawl(store, count):
+    comuni = [{"comune": c, "stato": "Italia"} for c in crawler.get_comuni_lettera(store.meta["lettera"])[:count]]
+    with workdir():
+        metrics.reset()
+        crawler.RESOLUTION_STATS.clear()
+        start = time.perf_counter()
+        records = crawler.search_comune_list(comuni, True)
+        elapsed = time.perf_counter() - start
+    mismatches = get_crawl_mismatches(store.meta["lettera"], records)
+    # le fixture sintetiche sono costruite dai result: un comune diverso vuol dire fixture o crawl sbagliati
+    if store.meta.get("synthetic") and mismatches:
+        raise SystemExit(f"crawl: {len(mismatches)} comuni diversi da results/result_{store.meta['lettera']}.jsonl: {mismatches[:10]}")
+    stages = {name: round(stats.seconds, 6) for name, stats in metrics.get_stages().items()}
+    return elapsed, len(comuni), {"stages": stages, "resolution": dict(crawler.RESOLUTION_STATS), "mismatches": len(mismatches)}
+
+
+def bench_parse(store, fast):
+    wikitexts = [wikitext for title, wikitext in store.iter_wikitexts()]
+    start = time.perf_counter()
+    for wikitext in wikitexts:
+        parse_gemellaggi(wikitext, fast=fast)
+    return time.perf_counter() - start, len(wikitexts), {}
+
+
+def bench_load_db():
+    with workdir() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "twinings.db"))
+        start = time.perf_counter()
+        load_db(conn, file_pattern, province_filename)
+        elapsed = time.perf_counter() - start
+        count = conn.execute("SELECT count(*) FROM twins").fetchone()[0]
+        conn.close()
+    return elapsed, count, {}
+
+
+def bench_reports():
+    reports = REPORTS + TEMP_REPORTS
+    with workdir() as tmp:
+        db_path = os.path.join(tmp, "twinings.db")
+        conn = sqlite3.connect(db_path)
+        load_db(conn, file_pattern, province_filename)
+        conn.close()
+        start = time.perf_counter()
+        run_reports(db_path, tmp, reports, force=True)
+        elapsed = time.perf_counter() - start
+    return elapsed, len(reports), {}
+
+
+def bench_export_csv():
+    with workdir() as tmp:
+        start = time.perf_counter()
+        count, count_fails = export_csv(iter_rows_from_results(file_pattern), os.path.join(tmp, "twinings.csv"),
+                                        os.path.join(tmp, "twinings_fails.csv"))
+        elapsed = time.perf_counter() - start
+    return elapsed, count + count_fails, {}
+
+
+def repeat(bench, times):
+    # vale la ripetizione più veloce; le altre restano in "runs"
+    runs = []
+    for _ in range(times):
+        with contextlib.redirect_stdout(io.StringIO()):
+            runs.append(bench())
+    elapsed, items, extra = min(runs, key=lambda run: run[0])
+    return {"seconds": round(elapsed, 6), "runs": [round(run[0], 6) for run in runs], "items": items,
+            "items_per_second": round(items / elapsed, 2) if elapsed else None, **extra}
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, previous=None):
+    print(f"{'benchmark':<12}{'elementi':>10}{'s':>10}{'el/s':>12}" + (f"{'prima s':>10}{'x':>7}" if previous else ""))
+    for name, result in results["benchmarks"].items():
+        line = f"{name:<12}{result['items']:>10}{result['seconds']:>10.3f}{result['items_per_second'] or 0:>12.1f}"
+        old = (previous or {}).get("benchmarks", {}).get(name)
+        if old:
+            line += f"{old['seconds']:>10.3f}{old['seconds'] / result['seconds']:>7.2f}"
+        print(line)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="benchmark offline della pipeline")
+    parser.add_argument("benchmarks", nargs="*", help=f"uno o più tra {', '.join(BENCHMARKS)} (default: tutti)")
+    parser.add_argument("-n", "--comuni", type=int, help="comuni del crawl (default: tutti quelli registrati)")
+    parser.add_argument("-r", "--repeat", type=int, default=REPEAT)
+    parser.add_argument("--fixtures", default=FIXTURES_PATH)
+    parser.add_argument("-o", "--output", help=f"file JSON dei risultati (default: {os.path.relpath(RESULTS_DIR, ROOT)}/<commit>.json)")
+    parser.add_argument("--compare", help="JSON di un run precedente")
+    parser.add_argument("--throttled", action="store_true", help="mantiene i limiti per host di wikiclient")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"benchmark sconosciuti: {', '.join(unknown)}")
+    args.benchmarks = args.benchmarks or list(BENCHMARKS)
+    return args
+
+
+if __name__ == "__main__":
+    args = get_args()
+    store = None
+    if os.path.exists(args.fixtures):
+        store = FixtureStore(args.fixtures).load()
+        install(FixtureAdapter(store))
+        if not args.throttled:
+            lift_limits()
+        # il memo dei gemelli risolti è disattivato anche in registrazione: stesse richieste, tutte nelle fixture
+        resolved.ENABLED = False
+
+    benches = {
+        "crawl": lambda: bench_crawl(store, args.comuni or store.meta["comuni"]),
+        "parse": lambda: bench_parse(store, True),
+        "parse-full": lambda: bench_parse(store, False),
+        "load-db": bench_load_db,
+        "reports": bench_reports,
+        "export-csv": bench_export_csv,
+    }
+    results = {
+        "commit": get_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "fixtures": store.meta if store else None,
+        "benchmarks": {},
+    }
+    for name in args.benchmarks:
+        if store is None and name in ("crawl", "parse", "parse-full"):
+            print(f"{name}: saltato, nessuna fixture in {args.fixtures} (bench/synthetic_fixtures.py o bench/record_fixtures.py)")
+            continue
+        results["benchmarks"][name] = repeat(benches[name], args.repeat)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit'] or 'bench'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    print_results(results, previous)
+    print(f"risultati: {output}")
@@ -0,0 +1,203 @@
+# fixture sintetiche per run_bench.py, senza rete: una wiki finta ricostruita dai result committati
+# risponde alle stesse richieste di un crawl vero dei primi N comuni di una lettera e le salva come record_fixtures.py
+import argparse
+import os
+import random
+import sys
+import tempfile
+import zlib
+
+from requests.adapters import BaseAdapter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import crawler
+import resolved
+from fixtures import FIXTURES_PATH, FixtureStore, install, lift_limits, make_response, split_request
+from gemellaggi import link_target
+from resultfiles import get_result_path, iter_result_file
+
+# dimensione indicativa del wikitext di un comune: le pagine vere di it.wikipedia vanno da pochi KB a oltre 100
+PARAGRAPHS = (2, 6)
+SECTIONS = ("Geografia fisica", "Origini del nome", "Storia", "Monumenti e luoghi d'interesse", "Società",
+            "Cultura", "Geografia antropica", "Economia", "Infrastrutture e trasporti")
+WORDS = ("il", "comune", "territorio", "della", "provincia", "fiume", "chiesa", "secolo", "castello", "piazza",
+         "abitanti", "frazione", "valle", "colle", "antica", "romana", "medievale", "borgo", "nel", "con",
+         "famiglia", "feudo", "parrocchia", "festa", "patrono", "torre", "palazzo", "strada", "ferrovia", "mercato")
+
+
+class SyntheticWiki:
+    # pagine it.wikipedia ed elementi Wikidata con i dati dei result: coordinate, stato e regione come li ha trovati il crawl
+    def __init__(self, records):
+        self.pages = {}
+        self.entities = {}
+        self.labels = {}
+        self.index = [comune.comune for comune in records]
+        for comune in records:
+            for gemello in comune.gemelli:
+                self.add_page(link_target(gemello.comune), gemello)
+        for comune in records:
+            self.add_page(comune.comune, comune, get_wikitext(comune, self.index))
+        self.titles = sorted(self.pages)
+
+    def label_qid(self, label):
+        # elemento per stati e regioni, solo con l'etichetta
+        if label not in self.labels:
+            qid = f"Q{len(self.entities) + 1}"
+            self.labels[label] = qid
+            self.entities[qid] = {"type": "item", "id": qid, "labels": {"it": {"language": "it", "value": label}}, "claims": {}}
+        return self.labels[label]
+
+    def add_page(self, title, record, wikitext=None):
+        # i gemelli che il crawl non ha trovato (senza stato né coordinate) non hanno una pagina: passano dalla ricerca
+        if record.lat is None and not record.stato and wikitext is None:
+            return
+        claims = {}
+        if record.stato:
+            claims["P17"] = [claim({"entity-type": "item", "id": self.label_qid(record.stato)}, "wikibase-entityid")]
+        if record.regione:
+            claims["P131"] = [claim({"entity-type": "item", "id": self.label_qid(record.regione)}, "wikibase-entityid")]
+        if record.lat is not None:
+            claims["P625"] = [claim({"latitude": record.lat, "longitude": record.lon, "globe": "http://www.wikidata.org/entity/Q2"}, "globecoordinate")]
+        # dopo label_qid: stato e regione appena creati hanno già preso i loro QID;
+        # pageid e revisione dal QID, unici anche quando la pagina del comune sostituisce quella del gemello
+        number = len(self.entities) + 1
+        qid = f"Q{number}"
+        self.entities[qid] = {"type": "item", "id": qid, "labels": {"it": {"language": "it", "value": title}}, "claims": claims}
+        page = {"pageid": number, "ns": 0, "title": title, "lastrevid": 140000000 + number,
+                "pageprops": {"wikibase_item": qid}, "stato": record.stato or "",
+                "wikitext": wikitext or f"'''{title}''' è una città.\n\n[[Categoria:Città]]"}
+        if record.found_coords and record.lat is not None:
+            page["coordinates"] = [{"lat": record.lat, "lon": record.lon, "primary": True, "globe": "earth"}]
+        # un crawl già in pagina (il comune) vince su quella del gemello con lo stesso nome
+        if wikitext is not None or title not in self.pages:
+            self.pages[title] = page
+
+    def respond(self, url, params):
+        if params.get("action") == "wbgetentities":
+            return self.get_entities(params)
+        if params.get("list") == "search":
+            return self.search(params["srsearch"], int(params.get("srlimit", 10)))
+        if "revids" in params:
+            return self.get_revisions(params["revids"].split("|"))
+        if params.get("prop") == "links":
+            return self.get_links(params["titles"])
+        return self.get_pages(params["titles"].split("|"))
+
+    def get_pages(self, titles):
+        pages = []
+        for title in titles:
+            page = self.pages.get(title)
+            if page is None:
+                pages.append({"ns": 0, "title": title, "missing": True})
+                continue
+            pages.append({key: value for key, value in page.items() if key not in ("stato", "wikitext")})
+        return {"batchcomplete": True, "query": {"pages": pages}}
+
+    def get_revisions(self, revids):
+        by_revid = {str(page["lastrevid"]): page for page in self.pages.values()}
+        pages = [{"pageid": page["pageid"], "ns": 0, "title": page["title"],
+                  "revisions": [{"revid": page["lastrevid"], "parentid": page["lastrevid"] - 1,
+                                 "slots": {"main": {"contentmodel": "wikitext", "contentformat": "text/x-wiki", "content": page["wikitext"]}}}]}
+                 for page in (by_revid[revid] for revid in revids if revid in by_revid)]
+        return {"batchcomplete": True, "query": {"pages": pages}}
+
+    def get_links(self, title):
+        links = [{"ns": 0, "title": comune} for comune in self.index]
+        return {"batchcomplete": "", "query": {"pages": {"1": {"pageid": 1, "ns": 0, "title": title.replace("_", " "), "links": links}}}}
+
+    def search(self, text, limit):
+        # titoli che iniziano con il testo cercato; lo snippet contiene lo stato, come le voci vere
+        prefix = text.lower()
+        hits = [self.pages[title] for title in self.titles if title.lower().startswith(prefix)][:limit]
+        return {"batchcomplete": "", "query": {"searchinfo": {"totalhits": len(hits)}, "search": [
+            {"ns": 0, "title": page["title"], "pageid": page["pageid"], "size": len(page["wikitext"]),
+             "snippet": f"<span class=\"searchmatch\">{page['title']}</span> è una città ({page['stato']})"} for page in hits]}}
+
+    def get_entities(self, params):
+        props = params.get("props", "").split("|")
+        entities = {}
+        for qid in params["ids"].split("|"):
+            entity = self.entities.get(qid)
+            if entity is None:
+                entities[qid] = {"id": qid, "missing": ""}
+                continue
+            entities[qid] = {"type": "item", "id": qid, **{prop: entity[prop] for prop in ("labels", "claims") if prop in props}}
+        return {"entities": entities, "success": 1}
+
+
+class SyntheticAdapter(BaseAdapter):
+    # trasporto della sessione requests: risponde dalla wiki finta e registra ogni risposta nel FixtureStore
+    def __init__(self, wiki, store):
+        super().__init__()
+        self.wiki = wiki
+        self.store = store
+
+    def send(self, request, **kwargs):
+        url, params = split_request(request.url)
+        body = self.wiki.respond(url, params)
+        self.store.put(url, params, body)
+        return make_response(request, body)
+
+    def close(self):
+        pass
+
+
+def claim(value, value_type):
+    return {"mainsnak": {"snaktype": "value", "datavalue": {"value": value, "type": value_type}}, "type": "statement", "rank": "normal"}
+
+
+def get_sentence(rng, links):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    words[rng.randrange(len(words))] = f"[[{rng.choice(links)}]]"
+    return " ".join(words).capitalize() + "."
+
+
+def get_wikitext(comune, links):
+    # voce di comune con la struttura di quelle vere: infobox, sezioni, note, gemellaggi, portali e categorie
+    rng = random.Random(zlib.crc32(comune.comune.encode("utf-8")))
+    lines = ["{{Divisione amministrativa", f"|Nome = {comune.comune}", "|Stato = ITA", "|Grado amministrativo = 3",
+             f"|Divisione amm grado 1 = {comune.regione or ''}", f"|Latitudine decimale = {comune.lat}",
+             f"|Longitudine decimale = {comune.lon}", f"|Altitudine = {rng.randint(0, 1500)}",
+             f"|Superficie = {rng.uniform(2, 300):.2f}", f"|Abitanti = {rng.randint(100, 100000)}",
+             "|Note abitanti = <ref>{{Cita web|url=https://demo.istat.it/|titolo=Bilancio demografico|editore=ISTAT}}</ref>",
+             "}}", "",
+             f"'''{comune.comune}''' è un [[comune italiano]] di {rng.randint(100, 100000)} abitanti.", ""]
+    for section in SECTIONS:
+        lines.append(f"== {section} ==")
+        for _ in range(rng.randint(*PARAGRAPHS)):
+            lines.append(" ".join(get_sentence(rng, links) for _ in range(rng.randint(3, 7))) +
+                         f"<ref>{{{{Cita libro|autore={rng.choice(WORDS).capitalize()}|titolo={rng.choice(SECTIONS)}|anno={rng.randint(1900, 2020)}}}}}</ref>")
+            lines.append("")
+    lines += ["== Amministrazione ==", "<!-- elenco dei sindaci -->", "=== Gemellaggi ==="]
+    lines += [f"* {{{{Gemellaggio|{gemello.stato or ''}|{gemello.comune}}}}}" for gemello in comune.gemelli]
+    lines += ["", "== Note ==", "<references/>", "", "{{Portale|Italia}}", "", f"[[Categoria:Comuni della {comune.regione or 'Italia'}]]"]
+    return "\n".join(lines)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="genera fixture sintetiche per run_bench.py dai result committati (senza rete)")
+    parser.add_argument("lettera", nargs="?", default="A")
+    parser.add_argument("-n", "--comuni", type=int, default=100, help="quanti comuni della lettera")
+    parser.add_argument("-o", "--output", default=FIXTURES_PATH)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    records = list(iter_result_file(get_result_path(args.lettera, os.path.join(ROOT, "results"))))
+    store = FixtureStore(os.path.abspath(args.output))
+    install(SyntheticAdapter(SyntheticWiki(records), store))
+    lift_limits()
+    # come in run_bench.py: senza memo dei gemelli risolti, ogni richiesta del crawl finisce nelle fixture
+    resolved.ENABLED = False
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        comuni = [{"comune": c, "stato": "Italia"} for c in crawler.get_comuni_lettera(args.lettera)[:args.comuni]]
+        crawled = crawler.search_comune_list(comuni, True)
+    # in ordine di chiave e non di arrivo dai thread: rigenerando con gli stessi result le righe restano le stesse
+    store.responses = dict(sorted(store.responses.items()))
+    store.meta = {"lettera": args.lettera, "comuni": len(comuni), "synthetic": True}
+    store.save()
+    print(f"{store.path}: {len(store.responses)} risposte, {len(crawled)} comuni")
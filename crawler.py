@@ -0,0 +1,364 @@
+import logging
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import httpcache
+import metrics
+import resolved
+import revisions
+import wikidata_dump
+from gemellaggi import parse_gemellaggi
+from journal import Journal, journal_path
+from mediawiki import BATCH_SIZE, WIKI_API, chunks, get_wikitexts, resolve_titles
+from names import stato_matches
+from records import Comune, Twin
+from resolved import get_resolved_store
+from resultfiles import RESULTS_DIR, get_result_path, iter_result_file, write_result_file
+from revisions import changed_comuni, get_revision_store
+from wikiclient import HOST_LIMITS, configure_host, create_shared_throttles, get_json, install_throttles
+from wikidata import get_claims, get_coordinates as get_wikidata_coordinates
+from wikidata_dump import get_dump_index
+
+
+# comuni (e gemelli) cercati in parallelo (crawl --workers); il limite per host è in wikiclient.HOST_LIMITS (--concurrency, --rate)
+WORKERS = 8
+# coordinate, stato e regione dall'indice locale del dump Wikidata (vedi wikidata_dump.py) invece che dall'API
+USE_WIKIDATA_DUMP = False
+# file JSONL con una riga per ogni fase del crawl (None: nessuna traccia)
+TRACE_PATH = None
+
+logger = logging.getLogger("twinings")
+
+# quante volte il titolo è stato trovato per titolo esatto, indice dei candidati o ricerca full-text
+RESOLUTION_STATS = Counter()
+# link delle pagine Comuni_d'Italia_(...) già scaricate
+INDEX_LINKS = {}
+
+
+def get_index_links(title):
+    # link della pagina indice, una sola volta per pagina: H, I e J condividono Comuni_d'Italia_(H-J)
+    if title in INDEX_LINKS:
+        return INDEX_LINKS[title]
+    params = {
+        "action": "query",
+        "titles": title,
+        "prop": "links",
+        "pllimit": "max",
+        "format": "json"
+    }
+
+    links = []
+    while True:
+        data = get_json(WIKI_API, params)
+        pages = data["query"]["pages"]
+        for page in pages.values():
+            links.extend(link["title"] for link in page.get("links", []))
+        # Controlla se ci sono più pagine (continue)
+        if "continue" in data:
+            params.update(data["continue"])
+        else:
+            break
+    INDEX_LINKS[title] = links
+    return links
+
+def get_comuni_lettera(lettera):
+    letteraSearch = lettera
+    if (lettera.upper() in ("H", "I", "J")):
+        letteraSearch = "H-J"
+    title = f"Comuni_d'Italia_({letteraSearch.upper()})"
+    return [link for link in get_index_links(title) if link.startswith(lettera)]
+
+def get_comune_real_name(title, stato, no_retry):
+    params = {
+        "action": "query",
+        "list": "search",
+        "srsearch": f"{title}",
+        "srlimit": 5,
+        "format": "json"
+    }
+    data = get_json(WIKI_API, params)
+
+    return_title = title
+    found_title = ''
+    if data.get("query", {}).get("search"):
+        return_title = data["query"]["search"][0]["title"]
+        for result in data.get("query", {}).get("search", []):
+            search_title = result.get("title", "")
+            search_snippet = result.get("snippet", "")
+            disambigua = "iniziano con o contengono il titolo".lower() in search_snippet.lower()
+            if search_title.strip().lower() == title.strip().lower() and not found_title:
+                found_title = search_title
+            if search_title.lower().startswith(title.lower()) and stato.lower() in search_snippet.lower() and not disambigua and not found_title:
+                found_title = search_title
+                break
+    if found_title:
+        return_title = found_title
+    if "(disambigua)" in return_title.lower():
+        if no_retry:
+            return_title = return_title.replace("(disambigua)", "").strip()
+        else: 
+            return_title = get_comune_real_name(f"{title} comune", stato, True)
+    return return_title
+
+def parallel_map(func, items, workers):
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    # map mantiene l'ordine di input: i result_<lettera>.jsonl restano identici
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+def get_claims_by_qid(qids):
+    index = get_dump_index() if USE_WIKIDATA_DUMP else None
+    claims_by_qid = index.get_claims(qids) if index is not None else {}
+    claims_by_qid.update(get_claims([qid for qid in qids if qid not in claims_by_qid]))
+    return claims_by_qid
+
+
+def resolve_real_names(keys, workers):
+    # titolo della pagina per ogni (comune, stato): prima titolo esatto o redirect (50 per chiamata),
+    # poi l'indice dei candidati dei run precedenti, la ricerca full-text solo per quelli che restano
+    real_names = {}
+    exact_pages = {}
+    with metrics.stage("resolve_titles", len(keys)):
+        pages = resolve_titles([key[0] for key in keys], wikitext=False)
+    exact = {key: pages[key[0]] for key in keys if key[0] in pages and not pages[key[0]]["missing"] and not pages[key[0]]["disambiguation"]}
+    qids = [page["qid"] for key, page in exact.items() if key[1] and page["qid"]]
+    with metrics.stage("get_wikidata_claims", len(qids)):
+        claims_by_qid = get_claims_by_qid(qids)
+    for key, page in exact.items():
+        # se il template dichiara lo stato, la pagina deve essere in quello stato (es. Caledon per Isola del Liri)
+        if not key[1] or (page["qid"] and stato_matches(key[1], claims_by_qid.get(page["qid"], ("", ""))[0])):
+            real_names[key] = page["title"]
+            exact_pages[key] = page
+            RESOLUTION_STATS["exact"] += 1
+
+    memo = get_resolved_store()
+    if memo is not None:
+        todo = [key for key in keys if key not in real_names]
+        with metrics.stage("find_candidates", len(todo)):
+            for key in todo:
+                candidates = memo.find_candidates(key[0])
+                titles = {title for title, qid, stato in candidates if not key[1] or stato_matches(key[1], stato)}
+                if len(titles) == 1:
+                    real_names[key] = titles.pop()
+                    RESOLUTION_STATS["candidates"] += 1
+
+    todo = [key for key in keys if key not in real_names]
+    with metrics.stage("get_comune_real_name", len(todo)):
+        titles = parallel_map(lambda key: get_comune_real_name(key[0], key[1], False), todo, workers)
+    for key, title in zip(todo, titles):
+        real_names[key] = title
+        RESOLUTION_STATS["search"] += 1
+    return real_names, exact_pages, claims_by_qid
+
+
+def search_comune_batch(comuni, search_gemelli, workers):
+    # i gemelli già risolti (in questo run o nei precedenti) non costano nessuna chiamata
+    memo = get_resolved_store() if not search_gemelli else None
+    keys = [(c.get("comune"), c.get("stato")) for c in comuni]
+    properties = {}
+    if memo is not None:
+        for key in set(keys):
+            found = memo.get(*key)
+            if found is not None:
+                properties[key] = found
+    todo = [key for key in dict.fromkeys(keys) if key not in properties]
+
+    real_names, exact_pages, claims_by_qid = resolve_real_names(todo, workers)
+    if memo is not None:
+        for key in todo:
+            found = memo.get_title(real_names[key])
+            if found is not None:
+                properties[key] = found
+                memo.put(key[0], key[1], real_names[key], None, found)
+        todo = [key for key in todo if key not in properties]
+
+    # con l'indice del dump Wikidata i gemelli non passano dall'API per coordinate e QID
+    index = get_dump_index() if USE_WIKIDATA_DUMP else None
+    pages = {key: exact_pages[key] for key in todo if key in exact_pages}
+    if index is not None and not search_gemelli:
+        for key in todo:
+            page = index.get_page(real_names[key])
+            if page is not None:
+                pages[key] = page
+    # coordinate e QID di tutto il batch con una chiamata ogni 50 titoli (i titoli esatti li hanno già)
+    titles = [real_names[key] for key in todo if key not in pages]
+    with metrics.stage("get_coordinates", len(titles)):
+        api_pages = resolve_titles(titles, wikitext=False)
+    pages.update({key: api_pages[real_names[key]] for key in todo if key not in pages})
+    if search_gemelli:
+        # wikitext per revisione: dalla cache se la pagina non è cambiata
+        with metrics.stage("get_wikitexts", len(pages)):
+            wikitexts = get_wikitexts(list(pages.values()))
+        for page in pages.values():
+            page["wikitext"] = wikitexts.get(page["title"])
+    if search_gemelli:
+        revisions = get_revision_store()
+        for key, page in pages.items():
+            revisions.put(key[0], page["title"], page["revid"])
+
+    # stato e regione di tutto il batch con wbgetentities, etichette dalla cache condivisa;
+    # i titoli esatti con stato dichiarato li hanno già da resolve_real_names
+    qids = [page["qid"] for page in pages.values() if page["qid"] and page["qid"] not in claims_by_qid]
+    with metrics.stage("get_wikidata_claims", len(qids)):
+        claims_by_qid.update(get_claims_by_qid(qids))
+    # pagine senza {{coord}}: P625 dell'elemento Wikidata
+    qids = [page["qid"] for page in pages.values() if page["qid"] and not page["found_coords"]]
+    if qids:
+        with metrics.stage("get_wikidata_coordinates", len(qids)):
+            coords_by_qid = get_wikidata_coordinates(qids)
+        for page in pages.values():
+            coords = coords_by_qid.get(page["qid"]) if not page["found_coords"] else None
+            if coords:
+                page["lat"], page["lon"] = coords
+                page["found_coords"] = True
+                metrics.count("coordinate da Wikidata")
+    for key, page in pages.items():
+        stato, regione = claims_by_qid[page["qid"]] if page["qid"] else ("", "")
+        properties[key] = {"lat": page["lat"], "lon": page["lon"], "stato": stato, "regione": regione, "found_coords": page["found_coords"], "found_claims": True, "qid": page["qid"]}
+        if memo is not None:
+            memo.put(key[0], key[1], real_names[key], page["qid"], properties[key])
+
+    if search_gemelli:
+        with metrics.stage("parse_gemellaggi", len(keys)):
+            gemelli = [parse_gemellaggi(pages[key]["wikitext"]) for key in keys]
+    else:
+        gemelli = [[] for _ in keys]
+    # i gemelli di tutto il batch vengono risolti insieme
+    gemelli_properties = search_comune_list([g for gs in gemelli for g in gs], False, workers) if search_gemelli else []
+
+    # Comune con i gemelli per i comuni, Twin (senza lista gemelli) per i gemelli
+    comuni_properties = []
+    offset = 0
+    for key, gs in zip(keys, gemelli):
+        comune = key[0]
+        if not search_gemelli:
+            comuni_properties.append(Twin.from_dict({**properties[key], "comune": comune}))
+            continue
+        twins = gemelli_properties[offset:offset + len(gs)]
+        offset += len(gs)
+        comune_properties = Comune.from_dict({**properties[key], "comune": comune})
+        comune_properties.gemelli = twins
+        comuni_properties.append(comune_properties)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"\nComune: {comune}\n"
+                         f"Coordinate: lat={comune_properties.lat}, lon={comune_properties.lon}\n"
+                         f"Stato: {comune_properties.stato}\n"
+                         f"Regione: {comune_properties.regione}\n"
+                         f"Found Coords: {comune_properties.found_coords}\n"
+                         f"Found Claims: {comune_properties.found_claims}\n"
+                         f"Gemelli: {twins}")
+    return comuni_properties
+
+
+def iter_comune_list(comuni, search_gemelli, workers=None):
+    # un batch alla volta: in memoria restano solo i comuni del batch corrente
+    workers = WORKERS if workers is None else workers
+    for batch in chunks(comuni, BATCH_SIZE):
+        yield from search_comune_batch(batch, search_gemelli, workers)
+
+
+def search_comune_list(comuni, search_gemelli, workers=None):
+    return list(iter_comune_list(comuni, search_gemelli, workers))
+
+def get_settings():
+    # impostazioni del run che il chiamante può aver cambiato a runtime: i worker spawn ripartono dai default dei moduli
+    return {"workers": WORKERS, "use_wikidata_dump": USE_WIKIDATA_DUMP, "trace_path": TRACE_PATH,
+            "log_level": logger.getEffectiveLevel(),
+            "http_cache_enabled": httpcache.ENABLED, "http_cache_path": httpcache.CACHE_PATH, "offline": httpcache.OFFLINE,
+            "http_ttl": dict(httpcache.TTL), "host_limits": {host: dict(limit) for host, limit in HOST_LIMITS.items()},
+            "resolved_enabled": resolved.ENABLED, "resolved_path": resolved.RESOLVED_PATH,
+            "revisions_path": revisions.REVISIONS_PATH, "wikidata_index_path": wikidata_dump.INDEX_PATH}
+
+
+def init_worker(throttles, settings):
+    # processo worker: stesso budget di richieste del padre e stesse impostazioni del run
+    global WORKERS, USE_WIKIDATA_DUMP, TRACE_PATH
+    # prima dei throttle condivisi: configure_host scarta quello già creato per l'host
+    for host, limit in settings["host_limits"].items():
+        configure_host(host, **limit)
+    install_throttles(throttles)
+    WORKERS = settings["workers"]
+    USE_WIKIDATA_DUMP = settings["use_wikidata_dump"]
+    TRACE_PATH = settings["trace_path"]
+    httpcache.ENABLED = settings["http_cache_enabled"]
+    httpcache.CACHE_PATH = settings["http_cache_path"]
+    httpcache.OFFLINE = settings["offline"]
+    httpcache.TTL.update(settings["http_ttl"])
+    resolved.ENABLED = settings["resolved_enabled"]
+    resolved.RESOLVED_PATH = settings["resolved_path"]
+    revisions.REVISIONS_PATH = settings["revisions_path"]
+    wikidata_dump.INDEX_PATH = settings["wikidata_index_path"]
+    logging.basicConfig(level=settings["log_level"], format="%(message)s")
+    metrics.open_trace(settings["trace_path"])
+
+
+def crawl_batch(comuni):
+    records = list(iter_comune_list([{"comune": c, "stato": "Italia"} for c in comuni], True))
+    # statistiche cumulative del processo: il padre tiene l'ultima di ogni worker
+    return os.getpid(), records, metrics.snapshot(), RESOLUTION_STATS
+
+
+def iter_crawl(comuni, processes):
+    if processes <= 1:
+        yield from iter_comune_list([{"comune": c, "stato": "Italia"} for c in comuni], True)
+        return
+    # spawn: i worker non ereditano sessioni HTTP né connessioni SQLite del padre
+    context = multiprocessing.get_context("spawn")
+    worker_stats = {}
+    with context.Pool(processes, initializer=init_worker, initargs=(create_shared_throttles(context), get_settings())) as pool:
+        for pid, records, snapshot, resolution_stats in pool.imap_unordered(crawl_batch, chunks(comuni, BATCH_SIZE)):
+            worker_stats[pid] = (snapshot, resolution_stats)
+            yield from records
+    for snapshot, resolution_stats in worker_stats.values():
+        metrics.merge(snapshot)
+        RESOLUTION_STATS.update(resolution_stats)
+
+
+def crawl(lettere, incremental, processes=1, results_dir=RESULTS_DIR, restart=False):
+    # una sola coda per tutte le lettere, senza comuni ripetuti; solo il padre scrive journal e result
+    # i result_<lettera>.jsonl vanno in results_dir, da dove --incremental parte se il journal è vuoto;
+    # il journal serve solo a riprendere un run interrotto: viene eliminato dopo i result, restart lo scarta subito
+    comuni_lettere = {lettera: get_comuni_lettera(lettera) for lettera in lettere}
+    if restart:
+        for lettera in lettere:
+            if os.path.exists(journal_path(lettera)):
+                os.remove(journal_path(lettera))
+    journals = {lettera: Journal(journal_path(lettera)) for lettera in lettere}
+    try:
+        todo = []
+        lettera_comune = {}
+        for lettera, comuni in comuni_lettere.items():
+            journal = journals[lettera]
+            filename = get_result_path(lettera, results_dir)
+            if incremental and not len(journal) and os.path.exists(filename):
+                # primo refresh su risultati di un crawl completo: il journal parte dal result esistente
+                for comune_properties in iter_result_file(filename):
+                    journal.append(comune_properties)
+
+            todo_lettera = [c for c in comuni if c not in journal]
+            if incremental:
+                todo_lettera += changed_comuni([c for c in comuni if c in journal])
+            print(f"Totale comuni con '{lettera}': {len(comuni)} (da cercare: {len(todo_lettera)})")
+            logger.debug("\n".join(todo_lettera))
+            todo += todo_lettera
+            lettera_comune.update((c, lettera) for c in comuni)
+
+        # nel journal vale l'ultima riga di ogni comune: i comuni cambiati vengono sostituiti
+        for comune_properties in iter_crawl(list(dict.fromkeys(todo)), processes):
+            with metrics.stage("serialize"):
+                journals[lettera_comune[comune_properties.comune]].append(comune_properties)
+
+        os.makedirs(results_dir, exist_ok=True)
+        for lettera, comuni in comuni_lettere.items():
+            with metrics.stage("write_result_file", len(comuni)):
+                write_result_file(os.path.join(results_dir, f"result_{lettera}.jsonl"), (journals[lettera].read(c) for c in comuni))
+        for journal in journals.values():
+            journal.remove()
+    finally:
+        for journal in journals.values():
+            journal.close()
+
@@ -0,0 +1,153 @@
+import contextlib
+import csv
+import gzip
+import itertools
+import sqlite3
+
+from records import Comune, Twin
+from resultfiles import glob_result_files, iter_result_file
+
+
+FIELDNAMES = [
+    "comune_start_id",
+    "comune_start_name",
+    "comune_start_lat",
+    "comune_start_log",
+    "comune_start_regione",
+    "comune_end_id",
+    "comune_end_name",
+    "comune_end_lat",
+    "comune_end_log",
+    "comune_end_stato",
+    "comune_end_found_coords",
+    "comune_end_found_claims",
+    "gemelli_names"
+]
+# righe per row group nel file Parquet: in memoria resta al massimo un batch
+PARQUET_BATCH = 10000
+
+
+def get_rows(start):
+    # righe CSV di un comune: gemelli_names è l'unica cosa che richiede tutti i gemelli del comune
+    gemelli_names = ', '.join([f'{g.comune} ({g.stato})' for g in start.gemelli])
+    for end in start.gemelli:
+        yield {
+            "comune_start_id": f"s_{start.comune}",
+            "comune_start_name": start.comune,
+            "comune_start_lat": start.lat,
+            "comune_start_log": start.lon,
+            "comune_start_regione": start.regione,
+            "comune_end_id": f"e_{end.comune}",
+            "comune_end_name": end.comune,
+            "comune_end_lat": end.lat,
+            "comune_end_log": end.lon,
+            "comune_end_stato": end.stato,
+            "comune_end_found_coords": end.found_coords,
+            "comune_end_found_claims": end.found_claims,
+            "gemelli_names": gemelli_names
+        }
+
+
+def iter_records_from_results(file_pattern):
+    # un Comune alla volta, senza caricare il file intero
+    for filename in glob_result_files(file_pattern):
+        yield from iter_result_file(filename)
+
+
+def get_flag(value):
+    # nel db i flag sono interi, nei result JSON booleani
+    return None if value is None else bool(value)
+
+
+def get_coord(value):
+    # le colonne REAL restituiscono -38.0 dove il JSON aveva -38
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+def iter_records_from_db(db_path):
+    # come iter_records_from_results, dai comuni con almeno un gemello nel db
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute("""SELECT C.id, C.comune, C.lat, C.log, C.provincia, T.comune, T.lat, T.log, T.stato, T.found_coords, T.found_claims
+            FROM comuni C INNER JOIN twins T ON C.id = T.idParent
+            ORDER BY C.id, T.id""")
+        for _, group in itertools.groupby(cursor, key=lambda row: row[0]):
+            group = list(group)
+            _, comune, lat, log, provincia = group[0][:5]
+            gemelli = [Twin(row[5], get_coord(row[6]), get_coord(row[7]), row[8],
+                            found_coords=get_flag(row[9]), found_claims=get_flag(row[10])) for row in group]
+            yield Comune(comune, get_coord(lat), get_coord(log), regione=provincia, gemelli=gemelli)
+    finally:
+        conn.close()
+
+
+def iter_rows_from_results(file_pattern):
+    for start in iter_records_from_results(file_pattern):
+        yield from get_rows(start)
+
+
+def iter_rows_from_db(db_path):
+    for start in iter_records_from_db(db_path):
+        yield from get_rows(start)
+
+
+class ParquetWriter:
+    # stessa interfaccia di csv.DictWriter, scrive un row group ogni PARQUET_BATCH righe
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.schema = pa.schema([(name, pa.float64() if name.endswith(("_lat", "_log")) else pa.bool_() if "_found_" in name else pa.string())
+                                 for name in FIELDNAMES])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.rows = []
+
+    def writeheader(self):
+        pass
+
+    def writerow(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= PARQUET_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def export_csv(rows, output_csv, output_fails_csv, gzip_output=False, parquet_output=False):
+    # un solo passaggio: ogni riga va subito nel CSV dei gemelli trovati o in quello dei fails
+    with contextlib.ExitStack() as stack:
+        def open_csv(path, opener=open, **kwargs):
+            f = stack.enter_context(opener(path, "wt", newline="", encoding="utf-8"))
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES, **kwargs)
+            writer.writeheader()
+            return writer
+
+        writers = [open_csv(output_csv, delimiter='|')]
+        fails_writers = [open_csv(output_fails_csv)]
+        if gzip_output:
+            writers.append(open_csv(output_csv + ".gz", gzip.open, delimiter='|'))
+            fails_writers.append(open_csv(output_fails_csv + ".gz", gzip.open))
+        if parquet_output:
+            for path, targets in ((output_csv, writers), (output_fails_csv, fails_writers)):
+                writer = ParquetWriter(path.rsplit(".", 1)[0] + ".parquet")
+                stack.callback(writer.close)
+                targets.append(writer)
+
+        count = count_fails = 0
+        for row in rows:
+            if row["comune_end_found_coords"] and row["comune_end_found_claims"]:
+                targets = writers
+                count += 1
+            else:
+                targets = fails_writers
+                count_fails += 1
+            for writer in targets:
+                writer.writerow(row)
+    return count, count_fails
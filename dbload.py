@@ -0,0 +1,246 @@
+import json
+
+from names import name_key, title_key, trigram_query
+from resultfiles import glob_result_files, iter_result_file
+
+
+# solo durante il caricamento: niente fsync a ogni transazione, journal WAL, cache più grande
+LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+# al termine il db torna un file unico come prima
+FINAL_PRAGMAS = (
+    "PRAGMA journal_mode=DELETE",
+    "PRAGMA synchronous=FULL",
+)
+# "ellipsoidal" (Vincenty vettoriale, come geodesic), "haversine" (sfera) o "geopy" (una chiamata per coppia)
+DISTANCE_MODE = "ellipsoidal"
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS twins_idParent ON twins (idParent)",
+    "CREATE INDEX IF NOT EXISTS twins_stato ON twins (stato)",
+    "CREATE INDEX IF NOT EXISTS comuni_comune ON comuni (comune)",
+    "CREATE INDEX IF NOT EXISTS comuni_name_key ON comuni (name_key)",
+)
+# indici di copertura per i report sullo schema normalizzato
+NORMALIZED_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS twinnings_comune ON twinnings (comune_id, place_id, distance)",
+    "CREATE INDEX IF NOT EXISTS twinnings_place ON twinnings (place_id, comune_id)",
+    "CREATE INDEX IF NOT EXISTS twinnings_distance ON twinnings (distance, comune_id, place_id)",
+    "CREATE INDEX IF NOT EXISTS places_stato ON places (stato, id)",
+    "CREATE INDEX IF NOT EXISTS comuni_comune ON comuni (comune)",
+    "CREATE INDEX IF NOT EXISTS comuni_name_key ON comuni (name_key)",
+)
+
+
+def drop_tables(c):
+    # twins può essere una tabella (schema classico) o una vista (schema normalizzato)
+    rows = c.execute("""SELECT name, type FROM sqlite_master
+        WHERE name IN ('twins', 'twinnings', 'places', 'comuni_fts', 'comuni', 'main_cities') AND type IN ('table', 'view')""").fetchall()
+    for name, kind in rows:
+        c.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+
+
+def create_tables(c, normalized=False):
+    drop_tables(c)
+
+    sql = """
+        CREATE TABLE IF NOT EXISTS comuni (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        comune TEXT,
+        lat REAL,
+        log REAL,
+        stato TEXT,
+        provincia TEXT,
+        found_coords INTEGER,
+        found_claims INTEGER,
+        name_key TEXT)
+    """
+    c.execute(sql)
+
+    # indice trigram sui nomi normalizzati dei comuni, per le ricerche approssimate
+    sql = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS comuni_fts USING fts5(name_key, content='comuni', content_rowid='id', tokenize='trigram')
+    """
+    c.execute(sql)
+
+    if normalized:
+        # una riga per città gemellata (per QID, altrimenti per nome|stato) e una per gemellaggio
+        sql = """
+            CREATE TABLE IF NOT EXISTS places (id INTEGER PRIMARY KEY,
+            qid TEXT,
+            comune TEXT,
+            lat REAL,
+            log REAL,
+            stato TEXT,
+            provincia TEXT,
+            found_coords INTEGER,
+            found_claims INTEGER)
+        """
+        c.execute(sql)
+
+        sql = """
+            CREATE TABLE IF NOT EXISTS twinnings (id INTEGER PRIMARY KEY,
+            comune_id INTEGER,
+            place_id INTEGER,
+            distance REAL)
+        """
+        c.execute(sql)
+
+        # stesse colonne della tabella twins: i report funzionano con entrambi gli schemi
+        sql = """
+            CREATE VIEW IF NOT EXISTS twins AS
+            SELECT W.id, W.comune_id AS idParent, P.comune, P.lat, P.log, W.distance, P.stato, P.provincia, P.found_coords, P.found_claims
+            FROM twinnings W INNER JOIN places P ON P.id = W.place_id
+        """
+        c.execute(sql)
+    else:
+        sql = """
+            CREATE TABLE IF NOT EXISTS twins (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idParent INTEGER,
+            comune TEXT,
+            lat REAL,
+            log REAL,
+            distance REAL,
+            stato TEXT,
+            provincia TEXT,
+            found_coords INTEGER,
+            found_claims INTEGER)
+        """
+        c.execute(sql)
+
+    sql = """
+        CREATE TABLE IF NOT EXISTS main_cities (name TEXT,
+        name_key TEXT,
+        fuzzy_query TEXT)
+    """
+    c.execute(sql)
+
+
+def is_normalized(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'twinnings'").fetchone() is not None
+
+
+def load_main_cities(c, province_filename):
+    with open(province_filename, "r", encoding="utf-8") as f:
+        province = json.load(f)
+    rows = []
+    for provincia in province:
+        # capoluoghi doppi separati da "-", nomi bilingui da "/" (vale il primo, in italiano)
+        for main_city in provincia.get("nome").split("-"):
+            key = name_key(main_city.split("/")[0])
+            rows.append((main_city.strip(), key, trigram_query(key)))
+    c.executemany("INSERT INTO main_cities (name, name_key, fuzzy_query) VALUES(?, ?, ?)", rows)
+
+
+def load_result_file(c, filename, id_comune):
+    # id espliciti: con executemany non c'è lastrowid per riga
+    comuni_rows = []
+    twins_rows = []
+    for comune in iter_result_file(filename):
+        id_comune += 1
+        comuni_rows.append((id_comune, comune.comune, comune.lat, comune.lon, comune.stato, comune.regione, comune.found_coords, comune.found_claims, title_key(comune.comune)))
+        for gemello in comune.gemelli:
+            twins_rows.append((gemello.comune, id_comune, gemello.lat, gemello.lon, None, gemello.stato, gemello.regione, gemello.found_coords, gemello.found_claims))
+    c.executemany(""" INSERT INTO comuni (id, comune, lat, log, stato, provincia, found_coords, found_claims, name_key)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, comuni_rows)
+    c.executemany(""" INSERT INTO twins (comune, idParent, lat, log, distance, stato, provincia, found_coords, found_claims)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, twins_rows)
+    return id_comune, len(comuni_rows), len(twins_rows)
+
+
+def get_place_key(gemello):
+    if gemello.qid:
+        return gemello.qid
+    # result senza QID: la stessa chiave del vecchio GROUP BY T.comune || T.stato
+    return f"{gemello.comune}|{gemello.stato}"
+
+
+def load_result_file_normalized(c, filename, id_comune, places):
+    # places: chiave del gemello -> id, condiviso tra i file (l'unicità è garantita qui, non da un indice)
+    comuni_rows = []
+    places_rows = []
+    twinnings_rows = []
+    for comune in iter_result_file(filename):
+        id_comune += 1
+        comuni_rows.append((id_comune, comune.comune, comune.lat, comune.lon, comune.stato, comune.regione, comune.found_coords, comune.found_claims, title_key(comune.comune)))
+        for gemello in comune.gemelli:
+            place_key = get_place_key(gemello)
+            if place_key not in places:
+                places[place_key] = len(places) + 1
+                places_rows.append((places[place_key], gemello.qid, gemello.comune, gemello.lat, gemello.lon, gemello.stato, gemello.regione, gemello.found_coords, gemello.found_claims))
+            twinnings_rows.append((id_comune, places[place_key]))
+    c.executemany(""" INSERT INTO comuni (id, comune, lat, log, stato, provincia, found_coords, found_claims, name_key)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, comuni_rows)
+    c.executemany(""" INSERT INTO places (id, qid, comune, lat, log, stato, provincia, found_coords, found_claims)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, places_rows)
+    c.executemany("INSERT INTO twinnings (comune_id, place_id) VALUES(?, ?)", twinnings_rows)
+    return id_comune, len(comuni_rows), len(twinnings_rows)
+
+
+def update_distances(c, mode=DISTANCE_MODE, normalized=False):
+    # tutte le distanze in un solo passaggio dopo gli insert, poi un update in blocco
+    # numpy e geopy solo qui: i report e gli export importano questo modulo senza caricarli
+    import numpy as np
+    from geodistance import distances_km
+
+    if normalized:
+        rows = c.execute("""SELECT W.id, C.lat, C.log, P.lat, P.log FROM twinnings W
+            JOIN comuni C ON C.id = W.comune_id
+            JOIN places P ON P.id = W.place_id
+            WHERE P.lat IS NOT NULL AND P.log IS NOT NULL AND C.lat IS NOT NULL AND C.log IS NOT NULL""").fetchall()
+    else:
+        rows = c.execute("""SELECT T.id, C.lat, C.log, T.lat, T.log FROM twins T
+            JOIN comuni C ON C.id = T.idParent
+            WHERE T.lat IS NOT NULL AND T.log IS NOT NULL AND C.lat IS NOT NULL AND C.log IS NOT NULL""").fetchall()
+    if not rows:
+        return 0
+    ids, lat1, lon1, lat2, lon2 = zip(*rows)
+    km = distances_km(lat1, lon1, lat2, lon2, mode)
+    table = "twinnings" if normalized else "twins"
+    c.executemany(f"UPDATE {table} SET distance = ? WHERE id = ?",
+        [(float(d), id_twin) for d, id_twin in zip(km, ids) if not np.isnan(d)])
+    return len(rows)
+
+
+def load_db(conn, file_pattern, province_filename, distance_mode=DISTANCE_MODE, normalized=False):
+    c = conn.cursor()
+    for pragma in LOAD_PRAGMAS:
+        c.execute(pragma)
+
+    with conn:
+        create_tables(c, normalized)
+        load_main_cities(c, province_filename)
+
+    id_comune = 0
+    places = {}
+    for filename in glob_result_files(file_pattern):
+        # una transazione per file
+        with conn:
+            if normalized:
+                id_comune, count_comuni, count_twins = load_result_file_normalized(c, filename, id_comune, places)
+            else:
+                id_comune, count_comuni, count_twins = load_result_file(c, filename, id_comune)
+        print(f"{filename}: {count_comuni} comuni, {count_twins} twins")
+
+    with conn:
+        count_distances = update_distances(c, distance_mode, normalized)
+    print(f"distanze ({distance_mode}): {count_distances}")
+    if normalized:
+        print(f"places: {len(places)}")
+
+    # gli indici si creano dopo il caricamento, non a ogni insert
+    with conn:
+        for sql in NORMALIZED_INDEXES if normalized else INDEXES:
+            c.execute(sql)
+        c.execute("INSERT INTO comuni_fts (comuni_fts) VALUES('rebuild')")
+        c.execute("ANALYZE")
+    for pragma in FINAL_PRAGMAS:
+        c.execute(pragma)
+    # le tabelle del caricamento precedente lasciano pagine libere nel file
+    c.execute("VACUUM")
@@ -0,0 +1,123 @@
+import logging
+import re
+
+import mwparserfromhell
+from mwparserfromhell.definitions import SINGLE
+
+
+logger = logging.getLogger("twinings")
+
+GEMELLAGGI_RE = re.compile(r"\{\{\s*[^{}|]*?gemellaggi", re.IGNORECASE)
+COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+# tag il cui contenuto mwparserfromhell non tratta come wikitext: in quel caso si fa il parse completo
+UNPARSED_TAGS_RE = re.compile(r"<\s*(?:nowiki|pre|math|source|syntaxhighlight|includeonly|noinclude|onlyinclude)\b", re.IGNORECASE)
+# nome del gemello scritto come link con testo: "San Cataldo (Italia){{!}}San Cataldo" o "[[Lione|Lyon]]"
+LINK_TEXT_RE = re.compile(r"\{\{\s*!\s*\}\}")
+# tag aperti prima di un template: <gallery>, <timeline>, <graph>... nascondono il template al parse completo
+TAG_RE = re.compile(r"<\s*(/?)\s*([a-zA-Z][\w-]*)[^<>]*?(/?)\s*>")
+WIKILINK_RE = re.compile(r"^\[\[([^\[\]|]*)(?:\|[^\[\]]*)?\]\]$")
+
+
+def link_target(name):
+    # titolo della pagina del gemello, senza il testo mostrato
+    match = WIKILINK_RE.match(name)
+    if match:
+        return match.group(1).strip()
+    return LINK_TEXT_RE.split(name, 1)[0].strip()
+
+
+def update_open_tags(depth, text, start, end):
+    # conta i tag aperti e chiusi in text[start:end] (esclusi <br>, <hr>, <li>... che non hanno chiusura);
+    # True se a end resta aperto almeno un tag
+    for match in TAG_RE.finditer(text, start, end):
+        closing, name, self_closing = match.groups()
+        name = name.lower()
+        if self_closing or name in SINGLE:
+            continue
+        depth[name] = depth.get(name, 0) + (-1 if closing else 1)
+    return any(count > 0 for count in depth.values())
+
+
+def find_template_end(text, start):
+    depth = 0
+    i = start
+    while i < len(text) - 1:
+        pair = text[i:i + 2]
+        if pair == "{{":
+            depth += 1
+            i += 2
+        elif pair == "}}":
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return i
+        else:
+            i += 1
+    return None
+
+
+def find_gemellaggi_templates(wikitext):
+    # testo dei soli template gemellaggi (con quelli annidati), None se serve il parse di tutta la pagina
+    if not GEMELLAGGI_RE.search(wikitext):
+        return ""
+    # i commenti vengono mascherati con spazi: i template commentati non contano e gli offset restano validi
+    masked = COMMENT_RE.sub(lambda m: " " * len(m.group()), wikitext)
+    # un <!-- senza chiusura per mwparserfromhell è testo: i template dopo contano, meglio il parse completo
+    if "<!--" in masked or UNPARSED_TAGS_RE.search(masked):
+        return None
+    spans = []
+    end = scanned = 0
+    depth = {}
+    for match in GEMELLAGGI_RE.finditer(masked):
+        start = match.start()
+        if start < end:
+            continue
+        if start > 0 and masked[start - 1] == "{":
+            return None
+        end = find_template_end(masked, start)
+        if end is None or "{{{" in masked[start:end] or "}}}" in masked[start:end]:
+            return None
+        # un template dentro <gallery>...</gallery> e simili per mwparserfromhell può non essere un template
+        if update_open_tags(depth, masked, scanned, end):
+            return None
+        scanned = end
+        spans.append(wikitext[start:end])
+    return "\n".join(spans)
+
+
+def parse_gemellaggi(wikitext, fast=True):
+    if not wikitext:
+        return []
+    templates_text = find_gemellaggi_templates(wikitext) if fast else None
+    wikicode = mwparserfromhell.parse(wikitext if templates_text is None else templates_text)
+    gemelli = []
+
+    # Cerca tutti i template {{Gemellaggio|Paese|Comune|...}}
+    for tpl in wikicode.filter_templates():
+#        if tpl.name.strip() in ("Gemellaggio", "Gemellaggi"):
+        if "gemellaggi" in tpl.name.strip().lower():
+            # for param in tpl.params:
+            #     value_code = mwparserfromhell.parse(str(param.value))
+            #     links = value_code.filter_wikilinks()
+            #     for link in links:
+            #         link_title = str(link.title).strip()
+            #         print(f"Parametro {param.name} → link: {link_title}")
+            
+            if tpl.has(2):
+                comune = link_target(tpl.get(2).value.strip())  # parametro 1 = stato parametro 2 = Comune
+                if tpl.has(1):
+                    stato = tpl.get(1).value.strip()
+                elif tpl.has('stato'):
+                    stato = tpl.get('stato').value.strip()
+                else:
+                    stato = ""
+                gemelli.append({"comune": comune, "stato": stato})
+            else:
+                if (tpl.has("città")):
+                    comune = link_target(tpl.get("città").split("=")[-1].strip())
+                    stato = ""
+                    gemelli.append({"comune": comune, "stato": stato})
+                else:
+                    # TODO: HERE 
+                    logger.warning(f"Template incompleto trovato: {tpl}")
+    return gemelli
@@ -0,0 +1,8 @@
+# equivale a: python -m twinings tiles (opzioni: python -m twinings tiles --help)
+import sys
+
+from twinings.cli import main
+
+
+if __name__ == "__main__":
+    sys.exit(main(["tiles", *sys.argv[1:]]))
@@ -0,0 +1,82 @@
+import numpy as np
+
+
+# WGS-84, lo stesso ellissoide di geopy.distance.geodesic
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+# raggio medio (IUGG) per haversine
+EARTH_RADIUS_KM = 6371.0088
+
+MAX_ITERATIONS = 200
+TOLERANCE = 1e-12
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    # sfera di raggio medio: rispetto a geodesic l'errore relativo resta sotto lo 0,56% (fino a ~40 km
+    # sulle distanze intercontinentali), abbastanza per le classifiche ma non per confronti al km
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def vincenty_km(lat1, lon1, lat2, lon2):
+    # formula inversa di Vincenty su tutto l'array: dove converge differisce da geodesic (Karney)
+    # per meno di 0,1 mm; le coppie quasi antipodali che non convergono sono calcolate con geopy
+    lat1, lon1, lat2, lon2 = (np.asarray(v, dtype=float) for v in (lat1, lon1, lat2, lon2))
+    f, a, b = WGS84_F, WGS84_A, WGS84_B
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sinU1, cosU1, sinU2, cosU2 = np.sin(U1), np.cos(U1), np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(MAX_ITERATIONS):
+            sinLam, cosLam = np.sin(lam), np.cos(lam)
+            sinSigma = np.hypot(cosU2 * sinLam, cosU1 * sinU2 - sinU1 * cosU2 * cosLam)
+            cosSigma = sinU1 * sinU2 + cosU1 * cosU2 * cosLam
+            sigma = np.arctan2(sinSigma, cosSigma)
+            sinAlpha = np.where(sinSigma == 0, 0.0, cosU1 * cosU2 * sinLam / sinSigma)
+            cos2Alpha = 1 - sinAlpha ** 2
+            # sull'equatore cos2Alpha = 0
+            cos2SigmaM = np.where(cos2Alpha == 0, 0.0, cosSigma - 2 * sinU1 * sinU2 / cos2Alpha)
+            C = f / 16 * cos2Alpha * (4 + f * (4 - 3 * cos2Alpha))
+            lam_prev = lam
+            lam = L + (1 - C) * f * sinAlpha * (sigma + C * sinSigma * (cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM ** 2)))
+            converged = np.abs(lam - lam_prev) < TOLERANCE
+            if converged.all():
+                break
+
+        uSq = cos2Alpha * (a ** 2 - b ** 2) / b ** 2
+        A = 1 + uSq / 16384 * (4096 + uSq * (-768 + uSq * (320 - 175 * uSq)))
+        B = uSq / 1024 * (256 + uSq * (-128 + uSq * (74 - 47 * uSq)))
+        deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (cosSigma * (-1 + 2 * cos2SigmaM ** 2)
+                     - B / 6 * cos2SigmaM * (-3 + 4 * sinSigma ** 2) * (-3 + 4 * cos2SigmaM ** 2)))
+        km = b * A * (sigma - deltaSigma) / 1000
+
+    # NaN in ingresso restano NaN, le altre coppie non convergenti passano da geopy
+    valid = ~(np.isnan(lat1) | np.isnan(lon1) | np.isnan(lat2) | np.isnan(lon2))
+    from geopy.distance import geodesic
+    for i in np.flatnonzero(valid & ~converged):
+        km[i] = geodesic((lat1[i], lon1[i]), (lat2[i], lon2[i])).km
+    return km
+
+
+def geodesic_km(lat1, lon1, lat2, lon2):
+    # riferimento: una chiamata a geopy per coppia
+    from geopy.distance import geodesic
+    return np.array([geodesic((p1, q1), (p2, q2)).km if not np.isnan([p1, q1, p2, q2]).any() else np.nan
+                     for p1, q1, p2, q2 in zip(lat1, lon1, lat2, lon2)], dtype=float)
+
+
+DISTANCE_FUNCTIONS = {
+    "ellipsoidal": vincenty_km,
+    "haversine": haversine_km,
+    "geopy": geodesic_km,
+}
+
+
+def distances_km(lat1, lon1, lat2, lon2, mode="ellipsoidal"):
+    return DISTANCE_FUNCTIONS[mode](lat1, lon1, lat2, lon2)
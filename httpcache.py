@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+CACHE_PATH = "cache/http.sqlite"
+ENABLED = True
+# replay only: usa solo le risposte già in cache (senza guardare il TTL) e non va mai in rete
+OFFLINE = False
+# oltre questa dimensione vengono eliminate le risposte usate meno di recente (LRU)
+MAX_BYTES = 2 * 1024 ** 3
+
+DAY = 24 * 3600
+# TTL in secondi per tipo di richiesta, vedi request_kind
+TTL = {
+    "links": 7 * DAY,
+    "search": 30 * DAY,
+    "info": 1 * DAY,
+    "query": 30 * DAY,
+    "wbgetentities": 30 * DAY,
+    "default": 7 * DAY,
+}
+
+
+class CacheMiss(Exception):
+    pass
+
+
+def request_key(url, params):
+    # parametri normalizzati: chiavi ordinate e valori come stringa
+    normalized = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    return hashlib.sha256(json.dumps([url, normalized], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def request_kind(params):
+    params = params or {}
+    if "action" not in params:
+        return "default"
+    if params["action"] != "query":
+        return params["action"]
+    if "list" in params:
+        return params["list"]
+    props = str(params.get("prop", "")).split("|")
+    if "links" in props:
+        return "links"
+    if "info" in props:
+        return "info"
+    return "query"
+
+
+class HttpCache:
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY,
+            url TEXT,
+            params TEXT,
+            revid INTEGER,
+            body BLOB,
+            size INTEGER,
+            created REAL,
+            accessed REAL)
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.size = self.conn.execute("SELECT coalesce(sum(size), 0) FROM responses").fetchone()[0]
+
+    def _get(self, key, ttl):
+        with self.lock:
+            row = self.conn.execute("SELECT body, created, revid FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            body, created, revid = row
+            if ttl is not None and not OFFLINE and time.time() - created > ttl:
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(body)), revid
+
+    def _put(self, key, url, params, data, revid=None):
+        body = zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("""INSERT OR REPLACE INTO responses (key, url, params, revid, body, size, created, accessed)
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?)""",
+                (key, url, json.dumps(params, ensure_ascii=False), revid, body, len(body), now, now))
+            self.size += len(body) - (old[0] if old else 0)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # elimina le risposte meno usate finché si torna al 90% del limite
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.size <= target:
+                break
+            evicted.append((key,))
+            self.size -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def get(self, url, params, ttl=None):
+        if ttl is None:
+            ttl = TTL.get(request_kind(params), TTL["default"])
+        hit = self._get(request_key(url, params), ttl)
+        return hit[0] if hit else None
+
+    def put(self, url, params, data):
+        self._put(request_key(url, params), url, params, data)
+
+    # risposte batch (titles=A|B|..., ids=Q1|Q2|...) salvate una voce per titolo o id, con la chiave della richiesta
+    # di quel solo valore: il replay non dipende da come il run ha raggruppato le richieste
+    def get_many(self, url, params, param, values, ttl=None):
+        if ttl is None:
+            ttl = TTL.get(request_kind(params), TTL["default"])
+        keys = {request_key(url, {**params, param: value}): value for value in values}
+        if not keys:
+            return {}
+        found = {}
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(f"SELECT key, body, created FROM responses WHERE key IN ({','.join('?' * len(keys))})",
+                                     list(keys)).fetchall()
+            for key, body, created in rows:
+                if ttl is not None and not OFFLINE and now - created > ttl:
+                    continue
+                found[key] = body
+            self.conn.executemany("UPDATE responses SET accessed = ? WHERE key = ?", [(now, key) for key in found])
+        return {keys[key]: json.loads(zlib.decompress(body)) for key, body in found.items()}
+
+    def put_many(self, url, params, param, items):
+        for value, data in items.items():
+            self._put(request_key(url, {**params, param: value}), url, {**params, param: value}, data)
+
+    # wikitext: valido finché la revisione della pagina non cambia, nessun TTL
+    def get_page(self, title, revid):
+        hit = self._get("page:" + title, None)
+        if hit and (revid is None or hit[1] == revid):
+            return hit[0]
+        return None
+
+    def put_page(self, title, revid, content):
+        self._put("page:" + title, None, {"title": title}, content, revid)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if not ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache(CACHE_PATH)
+        return _cache
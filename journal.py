@@ -0,0 +1,72 @@
+import json
+import os
+
+from records import dumps, loads
+
+
+JOURNAL_DIR = "journal"
+
+
+class Journal:
+    # un comune finito per riga (JSONL, solo append): un run interrotto riparte da qui
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.offsets = {}
+        good = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    self.offsets[record["comune"]] = good
+                    good += len(line)
+            # una riga scritta a metà da un crash viene scartata
+            if good != os.path.getsize(path):
+                with open(path, "r+b") as f:
+                    f.truncate(good)
+        self.file = open(path, "ab")
+        self.reader = open(path, "rb")
+
+    def __contains__(self, comune):
+        return comune in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, record):
+        line = (dumps(record) + "\n").encode("utf-8")
+        offset = self.file.tell()
+        self.file.write(line)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.offsets[record.comune] = offset
+
+    def read(self, comune):
+        self.reader.seek(self.offsets[comune])
+        return loads(self.reader.readline())
+
+    def close(self):
+        self.file.close()
+        self.reader.close()
+
+    def remove(self):
+        # run completato: il prossimo crawl riparte da zero (o dal result con --incremental)
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def journal_path(lettera):
+    return os.path.join(JOURNAL_DIR, f"journal_{lettera}.jsonl")
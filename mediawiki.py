@@ -0,0 +1,143 @@
+import metrics
+from httpcache import get_cache
+from wikiclient import get_cached_items, get_json, put_cached_items
+
+
+WIKI_API = "https://it.wikipedia.org/w/api.php"
+# massimo numero di titoli per richiesta action=query (utenti non bot)
+BATCH_SIZE = 50
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def query_pages(titles, params, api=WIKI_API):
+    # action=query su più titoli alla volta, seguendo normalizzazione, redirect e continue.
+    # Ritorna {titolo richiesto: pagina} con le prop di tutte le continuazioni unite;
+    # in cache una pagina per titolo richiesto, in rete vanno solo i titoli mancanti
+    result = {}
+    unique_titles = list(dict.fromkeys(t for t in titles if t))
+    base = {
+        "action": "query",
+        "redirects": 1,
+        "format": "json",
+        "formatversion": 2,
+        **params
+    }
+    for chunk in chunks(unique_titles, BATCH_SIZE):
+        pages = get_cached_items(api, base, "titles", chunk)
+        missing = [title for title in chunk if title not in pages]
+        if missing:
+            fetched, complete = fetch_pages(missing, base, api)
+            if complete:
+                put_cached_items(api, base, "titles", fetched)
+            pages.update(fetched)
+        for title in chunk:
+            result[title] = pages[title]
+    return result
+
+
+def fetch_pages(titles, base, api=WIKI_API):
+    # ({titolo: pagina}, False se l'API ha risposto con un errore: in quel caso niente cache)
+    complete = True
+    aliases = {}
+    pages = {}
+    cont = {}
+    while True:
+        data = get_json(api, {**base, "titles": "|".join(titles), **cont}, cache=False)
+        complete = complete and "error" not in data
+        query = data.get("query", {})
+        for alias in query.get("normalized", []) + query.get("redirects", []):
+            aliases[alias["from"]] = alias["to"]
+        for page in query.get("pages", []):
+            merged = pages.setdefault(page["title"], {})
+            for key, value in page.items():
+                merged.setdefault(key, value)
+        if "continue" not in data:
+            break
+        cont = data["continue"]
+
+    result = {}
+    for title in titles:
+        target = title
+        seen = {title}
+        while target in aliases and aliases[target] not in seen:
+            target = aliases[target]
+            seen.add(target)
+        result[title] = pages.get(target, {"title": target, "missing": True})
+    return result, complete
+
+
+def page_info(page):
+    coords = page.get("coordinates")
+    revisions = page.get("revisions")
+    return {
+        "title": page.get("title"),
+        "missing": bool(page.get("missing") or page.get("invalid")),
+        "lat": coords[0]["lat"] if coords else None,
+        "lon": coords[0]["lon"] if coords else None,
+        "found_coords": bool(coords),
+        "qid": page.get("pageprops", {}).get("wikibase_item"),
+        "disambiguation": "disambiguation" in page.get("pageprops", {}),
+        "revid": page.get("lastrevid"),
+        "wikitext": revisions[0]["slots"]["main"]["content"] if revisions else None,
+    }
+
+
+def get_wikitexts(pages):
+    # {titolo: wikitext}; dalla cache se la revisione non è cambiata, altrimenti per revids, 50 per chiamata
+    cache = get_cache()
+    wikitexts = {}
+    revids = []
+    for page in pages:
+        if page["missing"] or not page["revid"]:
+            continue
+        content = cache.get_page(page["title"], page["revid"]) if cache else None
+        if content is not None:
+            wikitexts[page["title"]] = content
+        else:
+            revids.append(str(page["revid"]))
+    metrics.count("wikitext dalla cache", len(wikitexts))
+    metrics.count("wikitext scaricati", len(set(revids)))
+
+    for chunk in chunks(list(dict.fromkeys(revids)), BATCH_SIZE):
+        params = {
+            "action": "query",
+            "revids": "|".join(chunk),
+            "prop": "revisions",
+            "rvprop": "ids|content",
+            "rvslots": "main",
+            "format": "json",
+            "formatversion": 2
+        }
+        cont = {}
+        while True:
+            # il wikitext va nella cache per revisione, non in quella per richiesta
+            data = get_json(WIKI_API, {**params, **cont}, cache=False)
+            for page in data.get("query", {}).get("pages", []):
+                for revision in page.get("revisions", []):
+                    content = revision["slots"]["main"]["content"]
+                    wikitexts[page["title"]] = content
+                    if cache:
+                        cache.put_page(page["title"], revision["revid"], content)
+            if "continue" not in data:
+                break
+            cont = data["continue"]
+    return wikitexts
+
+
+def get_api(language):
+    return f"https://{language}.wikipedia.org/w/api.php"
+
+
+def resolve_titles(titles, wikitext=True, api=WIKI_API):
+    # coordinate, QID e revisione di tutti i titoli, 50 per chiamata; il wikitext solo se richiesto (solo it.wikipedia)
+    params = {"prop": "coordinates|pageprops|info", "colimit": "max", "ppprop": "wikibase_item|disambiguation"}
+    pages = {title: page_info(page) for title, page in query_pages(titles, params, api).items()}
+    if wikitext:
+        wikitexts = get_wikitexts(list(pages.values()))
+        for page in pages.values():
+            page["wikitext"] = wikitexts.get(page["title"])
+    return pages
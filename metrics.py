@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+# limiti superiori (secondi) dei bucket dell'istogramma delle latenze per fase
+HISTOGRAM_BUCKETS = (0.01, 0.1, 1.0, 10.0, float("inf"))
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS)
+
+
+_stats = {}
+_stages = {}
+_counters = Counter()
+_lock = threading.Lock()
+_trace = None
+
+
+def record(endpoint, latency, nbytes=0, error=False, retry=False):
+    with _lock:
+        stats = _stats.setdefault(endpoint, EndpointStats())
+        stats.requests += 1
+        stats.bytes += nbytes
+        stats.latency += latency
+        stats.max_latency = max(stats.max_latency, latency)
+        if error:
+            stats.errors += 1
+        if retry:
+            stats.retries += 1
+
+
+def record_cache(endpoint, hit):
+    with _lock:
+        stats = _stats.setdefault(endpoint, EndpointStats())
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+def count(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+
+def record_stage(name, seconds, items=1):
+    with _lock:
+        stats = _stages.setdefault(name, StageStats())
+        stats.calls += 1
+        stats.items += items
+        stats.seconds += seconds
+        stats.max_seconds = max(stats.max_seconds, seconds)
+        stats.histogram[next(i for i, limit in enumerate(HISTOGRAM_BUCKETS) if seconds < limit)] += 1
+        if _trace is not None:
+            _trace.write(json.dumps({"stage": name, "seconds": round(seconds, 6), "items": items,
+                                     "time": time.time(), "pid": os.getpid(), "thread": threading.get_ident()}) + "\n")
+
+
+@contextmanager
+def stage(name, items=1):
+    # tempo di una fase del crawl (items: quanti comuni/pagine/QID elabora la chiamata)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start, items)
+
+
+def open_trace(path):
+    # una riga JSON per ogni fase, in append: più processi possono scrivere lo stesso file
+    global _trace
+    with _lock:
+        if _trace is not None:
+            _trace.close()
+        _trace = open(path, "a", encoding="utf-8", buffering=1) if path else None
+
+
+def snapshot():
+    # statistiche cumulative del processo, da passare a merge in un altro processo
+    with _lock:
+        return dict(_stats), dict(_stages), Counter(_counters)
+
+
+def merge(snapshot):
+    # statistiche raccolte in un altro processo (crawl multi-processo)
+    stats, stages, counters = snapshot
+    with _lock:
+        for endpoint, other in stats.items():
+            target = _stats.setdefault(endpoint, EndpointStats())
+            target.requests += other.requests
+            target.errors += other.errors
+            target.retries += other.retries
+            target.bytes += other.bytes
+            target.latency += other.latency
+            target.max_latency = max(target.max_latency, other.max_latency)
+            target.cache_hits += other.cache_hits
+            target.cache_misses += other.cache_misses
+        for name, other in stages.items():
+            target = _stages.setdefault(name, StageStats())
+            target.calls += other.calls
+            target.items += other.items
+            target.seconds += other.seconds
+            target.max_seconds = max(target.max_seconds, other.max_seconds)
+            target.histogram = [a + b for a, b in zip(target.histogram, other.histogram)]
+        _counters.update(counters)
+
+
+def reset():
+    # statistiche a zero, per misurare una fase alla volta (bench/run_bench.py)
+    with _lock:
+        _stats.clear()
+        _stages.clear()
+        _counters.clear()
+
+
+def get_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def get_stages():
+    with _lock:
+        return dict(_stages)
+
+
+def get_counters():
+    with _lock:
+        return Counter(_counters)
+
+
+def summary():
+    lines = [f"{'endpoint':<45}{'req':>7}{'err':>6}{'retry':>7}{'avg ms':>9}{'max ms':>9}{'MB':>8}{'cache':>8}{'hit %':>7}"]
+    for endpoint, stats in sorted(get_stats().items()):
+        avg = stats.latency / stats.requests if stats.requests else 0
+        lookups = stats.cache_hits + stats.cache_misses
+        hit_rate = f"{stats.cache_hits / lookups * 100:.0f}" if lookups else "-"
+        lines.append(f"{endpoint:<45}{stats.requests:>7}{stats.errors:>6}{stats.retries:>7}"
+                     f"{avg * 1000:>9.0f}{stats.max_latency * 1000:>9.0f}{stats.bytes / 1024 ** 2:>8.1f}{stats.cache_hits:>8}{hit_rate:>7}")
+
+    stages = get_stages()
+    if stages:
+        buckets = [f"<{limit * 1000:.0f}ms" if limit < 1 else f"<{limit:.0f}s" for limit in HISTOGRAM_BUCKETS[:-1]] + ["more"]
+        lines.append("")
+        lines.append(f"{'fase':<20}{'chiamate':>9}{'elementi':>9}{'tot s':>9}{'avg ms':>9}{'max ms':>9}" + "".join(f"{b:>8}" for b in buckets))
+        for name, stats in sorted(stages.items(), key=lambda item: -item[1].seconds):
+            avg = stats.seconds / stats.calls if stats.calls else 0
+            lines.append(f"{name:<20}{stats.calls:>9}{stats.items:>9}{stats.seconds:>9.1f}{avg * 1000:>9.0f}{stats.max_seconds * 1000:>9.0f}"
+                         + "".join(f"{n:>8}" for n in stats.histogram))
+
+    counters = get_counters()
+    if counters:
+        lines.append("")
+        lines.extend(f"{name}: {value}" for name, value in sorted(counters.items()))
+    return "\n".join(lines)
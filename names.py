@@ -0,0 +1,38 @@
+import re
+import unicodedata
+
+
+PARENTHESIS_RE = re.compile(r"\s*\([^)]*\)\s*$")
+NOT_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+# articoli e preposizioni dei nomi composti ("Reggio nell'Emilia", "Monza e della Brianza"), esclusi dalla ricerca approssimata
+STOPWORDS = {"del", "dell", "della", "delle", "dei", "degli", "nel", "nell", "nella", "nelle", "sul", "sull", "sulla",
+             "all", "alla", "dal", "dall", "dalla", "con", "per"}
+
+
+def name_key(name):
+    # chiave di confronto: minuscole, senza accenti, trattini/apostrofi/spazi ridotti a uno spazio
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKD", name.casefold())
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return NOT_ALNUM_RE.sub(" ", name).strip()
+
+
+def title_key(title):
+    # come name_key, senza il disambiguante finale: "Caledon (Ontario)" -> "caledon"
+    return name_key(PARENTHESIS_RE.sub("", title or ""))
+
+
+def trigram_query(key):
+    # query FTS5 (tokenizer trigram) per una chiave di name_key: almeno una delle parole di 3 o più lettere,
+    # senza articoli e preposizioni; i comuni che ne contengono di più (o le più rare) hanno il rank migliore
+    return " OR ".join(f'"{word}"' for word in key.split() if len(word) >= 3 and word not in STOPWORDS)
+
+
+def stato_matches(declared, label):
+    # lo stato dichiarato nel template può essere un nome, un link o una sigla: le sigle non si possono verificare
+    declared_key = name_key(declared)
+    if len(declared_key) <= 3:
+        return True
+    label_key = name_key(label)
+    return bool(label_key) and (declared_key in label_key or label_key in declared_key)
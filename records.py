@@ -0,0 +1,52 @@
+import json
+from dataclasses import dataclass, field
+
+
+# campi comuni a comune e gemello, nell'ordine in cui vengono scritti
+FIELDS = ("comune", "lat", "lon", "stato", "regione", "found_coords", "found_claims", "qid")
+
+
+@dataclass(slots=True)
+class Twin:
+    comune: str
+    lat: float = None
+    lon: float = None
+    stato: str = None
+    regione: str = None
+    found_coords: bool = None
+    found_claims: bool = None
+    qid: str = None
+
+    @classmethod
+    def from_dict(cls, data):
+        # accetta anche i vecchi result/journal, dove la longitudine era "log"
+        return cls(data.get("comune"), data.get("lat"), data.get("lon", data.get("log")), data.get("stato"),
+                   data.get("regione"), data.get("found_coords"), data.get("found_claims"), data.get("qid"))
+
+    def to_dict(self):
+        # i campi None non vengono scritti
+        return {name: value for name in FIELDS if (value := getattr(self, name)) is not None}
+
+
+@dataclass(slots=True)
+class Comune(Twin):
+    # solo i comuni hanno la lista dei gemelli, i gemelli no
+    gemelli: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data):
+        comune = super(Comune, cls).from_dict(data)
+        comune.gemelli = [Twin.from_dict(gemello) for gemello in data.get("gemelli", [])]
+        return comune
+
+    def to_dict(self):
+        return {**Twin.to_dict(self), "gemelli": [gemello.to_dict() for gemello in self.gemelli]}
+
+
+def dumps(record):
+    # una riga JSON compatta, senza spazi
+    return json.dumps(record.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(line):
+    return Comune.from_dict(json.loads(line))
@@ -0,0 +1,8 @@
+# equivale a: python -m twinings repair (opzioni: python -m twinings repair --help)
+import sys
+
+from twinings.cli import main
+
+
+if __name__ == "__main__":
+    sys.exit(main(["repair", *sys.argv[1:]]))
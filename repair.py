@@ -0,0 +1,210 @@
+import os
+import sqlite3
+
+import mwparserfromhell
+
+import metrics
+from dbload import DISTANCE_MODE, is_normalized, update_distances
+from gemellaggi import link_target, parse_gemellaggi
+from mediawiki import get_api, resolve_titles
+from names import stato_matches
+from records import Twin
+from resultfiles import glob_result_files, iter_result_file, write_result_file
+from wikidata import get_claims, get_coordinates
+
+
+# wiki in cui cercare un gemello che it.wikipedia non ha: prima quella dello stato, poi le altre in ordine
+STATO_LANGUAGES = {
+    "Francia": "fr",
+    "Germania": "de",
+    "Austria": "de",
+    "Svizzera": "de",
+    "Spagna": "es",
+    "Portogallo": "pt",
+    "Brasile": "pt",
+    "Polonia": "pl",
+    "Paesi Bassi": "nl",
+    "Belgio": "fr",
+    "Romania": "ro",
+    "Ungheria": "hu",
+    "Croazia": "hr",
+    "Slovenia": "sl",
+    "Repubblica Ceca": "cs",
+    "Slovacchia": "sk",
+    "Grecia": "el",
+    "Svezia": "sv",
+    "Argentina": "es",
+    "Messico": "es",
+    "Stati Uniti d'America": "en",
+    "Regno Unito": "en",
+}
+FALLBACK_LANGUAGES = ("en", "fr", "de")
+
+
+def is_broken(twin):
+    return not twin.stato or twin.lat is None or twin.lon is None
+
+
+def get_declared_stati(parents):
+    # {comune: [stato del template, ...]} nell'ordine dei gemelli; il wikitext viene dalla cache per revisione
+    pages = resolve_titles(parents)
+    declared = {}
+    for parent, page in pages.items():
+        declared[parent] = [(g["comune"], mwparserfromhell.parse(g["stato"]).strip_code().strip())
+                            for g in parse_gemellaggi(page["wikitext"])]
+    return declared
+
+
+def get_expected_stati(items):
+    # {id(twin): stato atteso}: quello già trovato o quello scritto nel template {{Gemellaggio|stato|comune}}
+    # della pagina del comune italiano. Può essere una sigla (FRA): serve solo a scartare pagine di un altro
+    # stato con names.stato_matches, lo stato del gemello viene sempre da P17
+    expected = {id(twin): twin.stato for parent, index, twin in items if twin.stato}
+    todo = [(parent, index, twin) for parent, index, twin in items if not twin.stato]
+    declared = get_declared_stati(list(dict.fromkeys(parent for parent, index, twin in todo)))
+    for parent, index, twin in todo:
+        gemelli = declared.get(parent, [])
+        # i gemelli sono nell'ordine del template; se la pagina è cambiata vale il nome
+        title = link_target(twin.comune)
+        if index < len(gemelli) and gemelli[index][0] == title:
+            expected[id(twin)] = gemelli[index][1]
+        else:
+            expected[id(twin)] = next((stato for comune, stato in gemelli if comune == title), "")
+    return expected
+
+
+def fetch_claims(qids, claims):
+    # stato e regione dei qid non ancora visti, una chiamata wbgetentities ogni 50
+    todo = [qid for qid in dict.fromkeys(qids) if qid and qid not in claims]
+    if todo:
+        claims.update(get_claims(todo))
+
+
+def apply_page(twin, page, source, stato, claims):
+    if page["missing"] or page["disambiguation"]:
+        return False
+    # come nel crawler: con uno stato atteso la pagina deve essere in quello stato (es. Caledon per Isola del Liri)
+    if stato and not (page["qid"] and stato_matches(stato, claims.get(page["qid"], ("", ""))[0])):
+        metrics.count("pagina di un altro stato")
+        return False
+    twin.qid = twin.qid or page["qid"]
+    twin.found_claims = True
+    if twin.lat is None and page["found_coords"]:
+        twin.lat, twin.lon, twin.found_coords = page["lat"], page["lon"], True
+        metrics.count(f"coordinate da {source}")
+    return True
+
+
+def apply_pages(twins, pages, source, expected, claims):
+    # id dei gemelli a cui è stata assegnata la pagina
+    fetch_claims([page["qid"] for page in pages.values() if not page["missing"] and not page["disambiguation"]], claims)
+    return {id(twin) for twin in twins if apply_page(twin, pages[link_target(twin.comune)], source, expected.get(id(twin)), claims)}
+
+
+def fill_from_wikis(items, expected, claims):
+    # 2. la pagina con il nome del template su it.wikipedia, poi sulle wiki delle altre lingue;
+    # i result dei crawl precedenti hanno ancora nomi come "San Cataldo (Italia){{!}}San Cataldo"
+    todo = [twin for parent, index, twin in items if not twin.qid and is_broken(twin)]
+    pages = resolve_titles([link_target(twin.comune) for twin in todo], wikitext=False)
+    found = apply_pages(todo, pages, "it.wikipedia", expected, claims)
+    todo = [twin for twin in todo if id(twin) not in found]
+
+    for attempt in range(len(FALLBACK_LANGUAGES) + 1):
+        by_language = {}
+        for twin in todo:
+            # la wiki dello stato atteso, se è un nome noto (le sigle no)
+            languages = [language for language in dict.fromkeys([STATO_LANGUAGES.get(expected.get(id(twin))), *FALLBACK_LANGUAGES]) if language]
+            if attempt < len(languages):
+                by_language.setdefault(languages[attempt], []).append(twin)
+        found = set()
+        for language, twins in by_language.items():
+            pages = resolve_titles([link_target(twin.comune) for twin in twins], wikitext=False, api=get_api(language))
+            found.update(apply_pages(twins, pages, f"{language}.wikipedia", expected, claims))
+        todo = [twin for twin in todo if id(twin) not in found]
+
+
+def fill_from_wikidata(items, claims):
+    # 3. coordinate (P625) e stato (P17) dall'elemento Wikidata
+    twins = [twin for parent, index, twin in items if twin.qid and is_broken(twin)]
+    qids = list(dict.fromkeys(twin.qid for twin in twins))
+    coordinates = get_coordinates(qids)
+    fetch_claims(qids, claims)
+    for twin in twins:
+        if twin.lat is None and coordinates.get(twin.qid):
+            twin.lat, twin.lon = coordinates[twin.qid]
+            twin.found_coords = True
+            metrics.count("coordinate da Wikidata")
+        stato, regione = claims.get(twin.qid, ("", ""))
+        if not twin.stato and stato:
+            twin.stato = stato
+            metrics.count("stato da Wikidata")
+        if not twin.regione and regione:
+            twin.regione = regione
+        twin.found_claims = True
+
+
+def repair_twins(items):
+    # items: [(comune italiano, posizione del gemello nel template, Twin)], i Twin vengono corretti sul posto
+    claims = {}
+    with metrics.stage("repair_template", len(items)):
+        expected = get_expected_stati(items)
+    with metrics.stage("repair_wikis", len(items)):
+        fill_from_wikis(items, expected, claims)
+    with metrics.stage("repair_wikidata", len(items)):
+        fill_from_wikidata(items, claims)
+    return sum(1 for parent, index, twin in items if not is_broken(twin))
+
+
+def repair_results(file_pattern):
+    # legge tutti i result, ma riscrive solo quelli con almeno un gemello corretto
+    files = {path: list(iter_result_file(path)) for path in glob_result_files(file_pattern)}
+    items = []
+    before = {}
+    for records in files.values():
+        for comune in records:
+            for index, twin in enumerate(comune.gemelli):
+                if is_broken(twin):
+                    items.append((comune.comune, index, twin))
+                    before[id(twin)] = twin.to_dict()
+    repaired = repair_twins(items)
+
+    for path, records in files.items():
+        if any(id(twin) in before and twin.to_dict() != before[id(twin)] for comune in records for twin in comune.gemelli):
+            output = os.path.splitext(path)[0] + ".jsonl"
+            write_result_file(output, records)
+            if output != path:
+                os.remove(path)
+    return len(items), repaired
+
+
+def repair_db(db_path, distance_mode=DISTANCE_MODE):
+    # corregge twins (o places nello schema normalizzato) e ricalcola le distanze
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    normalized = is_normalized(conn)
+    if normalized:
+        # un place può essere gemello di più comuni: basta correggerlo una volta
+        rows = c.execute("""SELECT P.id, C.comune, W.position, P.comune, P.lat, P.log, P.stato, P.provincia, P.found_coords, P.found_claims, P.qid
+            FROM places P
+            INNER JOIN (SELECT place_id, comune_id, ROW_NUMBER() OVER (PARTITION BY comune_id ORDER BY id) - 1 AS position, id FROM twinnings) W ON W.place_id = P.id
+            INNER JOIN comuni C ON C.id = W.comune_id
+            WHERE P.stato IS NULL OR P.stato = '' OR P.lat IS NULL OR P.log IS NULL
+            GROUP BY P.id""").fetchall()
+    else:
+        rows = c.execute("""SELECT T.id, C.comune, T.position, T.comune, T.lat, T.log, T.stato, T.provincia, T.found_coords, T.found_claims, NULL
+            FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY idParent ORDER BY id) - 1 AS position FROM twins) T
+            INNER JOIN comuni C ON C.id = T.idParent
+            WHERE T.stato IS NULL OR T.stato = '' OR T.lat IS NULL OR T.log IS NULL""").fetchall()
+    items = [(parent, position, Twin(comune, lat, log, stato, provincia, found_coords, found_claims, qid))
+             for _, parent, position, comune, lat, log, stato, provincia, found_coords, found_claims, qid in rows]
+    repaired = repair_twins(items)
+
+    table = "places" if normalized else "twins"
+    with conn:
+        c.executemany(f"UPDATE {table} SET lat = ?, log = ?, stato = ?, provincia = ?, found_coords = ?, found_claims = ? WHERE id = ?",
+            [(twin.lat, twin.lon, twin.stato, twin.regione, twin.found_coords, twin.found_claims, row[0]) for row, (parent, position, twin) in zip(rows, items)])
+        if normalized:
+            c.executemany("UPDATE places SET qid = ? WHERE id = ?", [(twin.qid, row[0]) for row, (parent, position, twin) in zip(rows, items)])
+        update_distances(c, distance_mode, normalized)
+    conn.close()
+    return len(items), repaired
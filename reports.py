@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from dbload import is_normalized
+
+
+WORKERS = 4
+MANIFEST_NAME = ".manifest.json"
+
+# formats: "html" scrive <output_reports>/<name>.html, "console" stampa le righe (sempre, anche se l'html è aggiornato)
+# normalized_sql: query alternativa per lo schema places/twinnings
+Report = namedtuple("Report", ["name", "sql", "subtitle", "formats", "normalized_sql"], defaults=["", ("html",), None])
+
+
+REPORTS = [
+    Report("count-comuni", """SELECT count(*) as comuni_total from comuni"""),
+    Report("count-twins", """SELECT count(*) as twins_total from twins"""),
+    Report("top-20-distance", """SELECT C.comune || ', ' ||  C.provincia as comune, T.comune || ', ' ||  T.stato as twin, round(T.distance) as distance
+    from comuni C inner join twins T on C.id = T.idParent
+    order by distance DESC
+    limit 20
+    """, "maggiore distanza tra comune e gemello internazionale"),
+    Report("top-20-distance-local", """SELECT C.comune || ', ' || C.provincia as comune, T.comune || ', ' ||  T.provincia as twin, round(T.distance) as distance
+    from comuni C inner join twins T on C.id = T.idParent
+    where lower(T.stato) = 'italia'
+    order by distance DESC
+    limit 20
+    """, "maggiore distanza tra comune e gemello nazionale"),
+    Report("top-20-less-distance", """SELECT C.comune || ', ' ||  C.provincia as comune, T.comune || ', ' ||  T.provincia as twin, round(T.distance) as distance
+    from comuni C inner join twins T on C.id = T.idParent
+    where not distance is null and distance > 0
+    order by distance ASC
+    limit 20
+    """, "minore distanza tra comune e gemello"),
+    Report("top-20-twinings", """SELECT C.comune, C.provincia, count(T.id) as twins_count
+    from comuni C inner join twins T on C.id = T.idParent
+    group by C.comune, C.provincia
+    order by twins_count DESC
+    limit 20
+    """, "maggior numero di gemellaggi"),
+    Report("top-20-twining-states", """SELECT case when T.stato = '' then 'not-found' else T.stato end as stato, count(T.id) as stati_count
+    from twins T
+    group by T.stato
+    order by stati_count DESC
+    limit 20
+    """, "maggior numero di stati gemellati"),
+    Report("single-twin-states", """
+    SELECT C.comune, T.stato, TT.stati_count from
+    comuni C inner join twins T on C.id = T.idParent
+    inner join (
+        SELECT T.stato, count(T.id) as stati_count
+        from twins T
+        group by T.stato
+        having count(T.id)=1
+        ) TT on T.stato = TT.stato
+    """, "stati con un solo gemellaggio"),
+    Report("top-20-twining-cities", """
+    SELECT T.comune ||  ', ' || T.stato as twin, count(T.idParent) as count_twinigs, GROUP_CONCAT(C.comune, "<br>") AS comuni from
+    twins T inner join Comuni C on T.idParent = C.id
+    group by T.comune || T.stato
+    order by count_twinigs desc
+    limit 20
+    """, "città gemellata con più comuni", normalized_sql="""
+    SELECT P.comune ||  ', ' || P.stato as twin, count(W.comune_id) as count_twinigs, GROUP_CONCAT(C.comune, "<br>") AS comuni from
+    twinnings W inner join places P on W.place_id = P.id
+    inner join comuni C on W.comune_id = C.id
+    group by W.place_id
+    order by count_twinigs desc
+    limit 20
+    """),
+]
+
+# query di controllo sui dati, generate sempre
+TEMP_REPORTS = [
+    Report("twin-without-state", """SELECT C.comune, T.* from twins T
+inner join comuni C  on C.id = T.idParent
+where T.stato is null or T.stato = ''
+"""),
+    Report("count-twin-without-state", """SELECT count(T.id) from twins T
+inner join comuni C  on C.id = T.idParent
+where T.stato is null or T.stato = ''
+"""),
+    Report("twin-without-coords", """SELECT C.comune, T.* from twins T
+inner join comuni C  on C.id = T.idParent
+where T.lat is null or T.log is null
+"""),
+    Report("count-twin-without-coords", """SELECT count(T.id) from twins T
+inner join comuni C  on C.id = T.idParent
+where T.lat is null or T.log is null
+"""),
+    Report("count-comuni-without-twins", """
+select 'without', (
+    SELECT count(C.id) from comuni C
+    LEFT join twins T on C.id = T.idParent
+    where T.id is null) as count
+union
+select 'with', (
+    SELECT count(C.id) from comuni C
+    INNER join twins T on C.id = T.idParent) as count
+"""),
+    # un capoluogo c'è se la chiave normalizzata è uguale (indice) o se un solo comune la estende con altre parole
+    # ("Tempio" -> "Tempio Pausania"); i 5 candidati approssimati dell'indice trigram sono solo un suggerimento, mai un match
+    Report("main_cities_without_data", """
+SELECT MC.name, (
+    SELECT GROUP_CONCAT(comune, ', ') from (
+        SELECT C.comune from comuni_fts F
+        inner join comuni C on C.id = F.rowid
+        where MC.fuzzy_query != '' and comuni_fts MATCH MC.fuzzy_query
+        order by F.rank, C.comune limit 5)) as candidati
+from main_cities MC
+where not exists (SELECT 1 from comuni C where C.name_key = MC.name_key)
+and (SELECT count(*) from comuni C where C.name_key > MC.name_key || ' ' and C.name_key < MC.name_key || '!') != 1
+""", formats=("html", "console")),
+]
+
+
+def get_cell_text(val):
+    if isinstance(val, (int, float)):
+        formatted = f"{val:,.0f}"
+        formatted = formatted.replace(",", ".")
+        return formatted
+    else:
+        return val
+
+
+def save_rows_to_html(rows, col_names, filename, reportname, subtitle):
+    rows = [(i + 1, *row) for i, row in enumerate(rows)]
+    col_names = ["#"] + col_names
+    html = "<table border='1'>\n"
+    html += "  <tr><th class='title' colspan=" + str(len(col_names)) + ">" + reportname + "</th></tr>\n"
+    if subtitle: html += "  <tr><th class='title' colspan=" + str(len(col_names)) + ">" + subtitle + "</th></tr>\n"
+    html += "  <tr>" + "".join(f"<th>{col}</th>" for col in col_names) + "</tr>\n"
+    for row in rows:
+        html += "  <tr>" + "".join(f"<td>{get_cell_text(val)}</td>" for val in row) + "</tr>\n"
+    html += "</table>"
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+def print_rows(rows):
+    print("-" * 100)
+    for row in rows:
+        print(" ".join(f"{str(col):<20}" for col in row))
+
+
+def db_hash(db_path):
+    # hash del contenuto del db: se non cambia, i report non cambiano
+    digest = hashlib.sha256()
+    with open(db_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def report_hash(report, sql):
+    return hashlib.sha256(json.dumps([report.name, sql, report.subtitle, list(report.formats)]).encode("utf-8")).hexdigest()
+
+
+def load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def run_report(db_path, sql):
+    # una connessione in sola lettura per report: le query girano in parallelo
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        start = time.perf_counter()
+        cursor = conn.execute(sql)
+        rows = cursor.fetchall()
+        col_names = [desc[0] for desc in cursor.description]
+        return rows, col_names, time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def run_reports(db_path, output_reports, reports, workers=WORKERS, force=False):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    normalized = is_normalized(conn)
+    conn.close()
+    current_db = db_hash(db_path)
+    os.makedirs(output_reports, exist_ok=True)
+    manifest_path = os.path.join(output_reports, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    todo = []
+    for report in reports:
+        sql = report.normalized_sql if normalized and report.normalized_sql else report.sql
+        entry = {"db": current_db, "report": report_hash(report, sql)}
+        filename = os.path.join(output_reports, report.name + ".html")
+        up_to_date = manifest.get(report.name, {}).get("db") == entry["db"] and manifest.get(report.name, {}).get("report") == entry["report"]
+        if not force and up_to_date and os.path.exists(filename) and "console" not in report.formats:
+            print(f"{report.name}: aggiornato, saltato")
+            continue
+        todo.append((report, sql, entry, filename))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo)))) as pool:
+        results = list(pool.map(lambda item: run_report(db_path, item[1]), todo))
+
+    # l'output resta nell'ordine del registro
+    for (report, sql, entry, filename), (rows, col_names, elapsed) in zip(todo, results):
+        if "html" in report.formats:
+            save_rows_to_html(rows, col_names, filename, report.name.replace("-", " "), report.subtitle)
+        if "console" in report.formats:
+            print_rows(rows)
+        manifest[report.name] = {**entry, "rows": len(rows), "seconds": round(elapsed, 4)}
+        print(f"{report.name}: {len(rows)} righe in {elapsed * 1000:.1f} ms")
+    save_manifest(manifest_path, manifest)
@@ -0,0 +1,87 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from names import name_key, title_key
+
+
+RESOLVED_PATH = "cache/resolved.sqlite"
+ENABLED = True
+# dopo questo tempo un gemello viene risolto di nuovo
+TTL = 30 * 24 * 3600
+
+
+class ResolvedStore:
+    # gemelli già risolti, per coppia (comune, stato) del template e per titolo finale della pagina
+    def __init__(self, path, ttl=TTL):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS resolved (comune TEXT,
+            stato TEXT,
+            title TEXT,
+            qid TEXT,
+            properties TEXT,
+            created REAL,
+            PRIMARY KEY (comune, stato))
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS resolved_title ON resolved (title)")
+        # indice dei candidati: nome normalizzato -> (titolo, QID, stato) dei gemelli già risolti
+        self.conn.create_function("name_key", 1, name_key, deterministic=True)
+        self.conn.create_function("title_key", 1, title_key, deterministic=True)
+        exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'candidates'").fetchone()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS candidates (name_key TEXT,
+            title TEXT,
+            qid TEXT,
+            stato TEXT,
+            PRIMARY KEY (name_key, title))
+        """)
+        if not exists:
+            self.conn.execute("""INSERT OR IGNORE INTO candidates (name_key, title, qid, stato)
+                SELECT name_key(comune), title, qid, json_extract(properties, '$.stato') FROM resolved
+                UNION SELECT title_key(title), title, qid, json_extract(properties, '$.stato') FROM resolved""")
+
+    def _fetch(self, sql, params):
+        with self.lock:
+            row = self.conn.execute(sql, params + (time.time() - self.ttl,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, comune, stato):
+        return self._fetch("SELECT properties FROM resolved WHERE comune = ? AND stato = ? AND created > ?", (comune, stato or ""))
+
+    def get_title(self, title):
+        return self._fetch("SELECT properties FROM resolved WHERE title = ? AND created > ? ORDER BY created DESC", (title,))
+
+    def put(self, comune, stato, title, qid, properties):
+        with self.lock:
+            self.conn.execute("""INSERT OR REPLACE INTO resolved (comune, stato, title, qid, properties, created)
+                VALUES(?, ?, ?, ?, ?, ?)""",
+                (comune, stato or "", title, qid, json.dumps(properties, ensure_ascii=False), time.time()))
+            self.conn.executemany("""INSERT OR REPLACE INTO candidates (name_key, title, qid, stato)
+                VALUES(?, ?, ?, ?)""",
+                [(key, title, qid, properties.get("stato")) for key in {name_key(comune), title_key(title)} if key])
+
+    def find_candidates(self, comune):
+        with self.lock:
+            return self.conn.execute("SELECT title, qid, stato FROM candidates WHERE name_key = ?", (name_key(comune),)).fetchall()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_resolved_store():
+    global _store
+    if not ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ResolvedStore(RESOLVED_PATH)
+        return _store
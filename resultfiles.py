@@ -0,0 +1,86 @@
+import glob
+import json
+import os
+
+from records import Comune, dumps, loads
+
+
+# cartella dei result_<lettera>.jsonl scritti dal crawl
+RESULTS_DIR = "results"
+
+def write_result_file(path, records):
+    # scrive un result_<lettera>.jsonl: un comune per riga, JSON compatto
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(dumps(record) + "\n")
+    os.replace(tmp_path, path)
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    # legge un array JSON un elemento alla volta: in memoria resta solo l'elemento corrente
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+    while not eof and not buffer.strip():
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+    pos = len(buffer) - len(buffer.lstrip())
+    if buffer[pos:pos + 1] != "[":
+        raise ValueError(f"atteso un array JSON in {getattr(f, 'name', f)}")
+    pos += 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        end = None
+        if pos < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+        # elemento incompleto (o finito proprio a fine buffer): serve un altro pezzo di file
+        if end is None or (end == len(buffer) and not eof):
+            if eof:
+                raise ValueError(f"array JSON non chiuso in {getattr(f, 'name', f)}")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+
+
+def iter_result_file(path):
+    # record Comune dai result_<lettera>.jsonl e dai vecchi result_<lettera>.json (array JSON indentato)
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            for data in iter_json_array(f):
+                yield Comune.from_dict(data)
+        else:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+
+
+def get_result_path(lettera, results_dir=RESULTS_DIR):
+    # il result già scritto per la lettera: quello nuovo o, se manca, quello vecchio
+    path = os.path.join(results_dir, f"result_{lettera}.jsonl")
+    return path if os.path.exists(path) or not os.path.exists(path[:-1]) else path[:-1]
+
+
+def glob_result_files(file_pattern):
+    # per un pattern *.jsonl anche i vecchi *.json delle lettere che non hanno ancora il file nuovo
+    # in ordine di nome: db, CSV e tile escono sempre nello stesso ordine
+    paths = glob.glob(file_pattern)
+    if file_pattern.endswith(".jsonl"):
+        stems = {os.path.splitext(path)[0] for path in paths}
+        paths += [path for path in glob.glob(file_pattern[:-1]) if os.path.splitext(path)[0] not in stems]
+    return sorted(paths)
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import threading
+import time
+
+from mediawiki import query_pages
+
+
+REVISIONS_PATH = "journal/revisions.sqlite"
+
+
+class RevisionStore:
+    # ultima revisione vista della pagina di ogni comune, per il refresh incrementale
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS revisions (comune TEXT PRIMARY KEY,
+            title TEXT,
+            revid INTEGER,
+            checked REAL)
+        """)
+
+    def get(self, comune):
+        with self.lock:
+            return self.conn.execute("SELECT title, revid FROM revisions WHERE comune = ?", (comune,)).fetchone()
+
+    def put(self, comune, title, revid):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO revisions (comune, title, revid, checked) VALUES(?, ?, ?, ?)",
+                (comune, title, revid, time.time()))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_revision_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RevisionStore(REVISIONS_PATH)
+        return _store
+
+
+def changed_comuni(comuni):
+    # comuni la cui pagina ha una revisione diversa dall'ultima vista (o mai vista), con prop=info 50 titoli per chiamata
+    store = get_revision_store()
+    known = {}
+    for comune in comuni:
+        row = store.get(comune)
+        if row and row[1]:
+            known[comune] = row
+    pages = query_pages([title for title, _ in known.values()], {"prop": "info"})
+    changed = []
+    for comune in comuni:
+        if comune not in known:
+            changed.append(comune)
+            continue
+        title, revid = known[comune]
+        if pages.get(title, {}).get("lastrevid") != revid:
+            changed.append(comune)
+    return changed
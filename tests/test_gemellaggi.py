@@ -0,0 +1,46 @@
+# la scansione veloce di parse_gemellaggi deve dare gli stessi gemelli del parse completo di mwparserfromhell
+import pytest
+
+from gemellaggi import find_gemellaggi_templates, link_target, parse_gemellaggi
+
+LIONE = "{{Gemellaggio|FRA|Lione}}"
+
+WIKITEXTS = [
+    # caso normale, con note e tag che non contano
+    "'''Abano'''<ref>{{Cita web|url=x}}</ref> è un comune.<br>\n== Gemellaggi ==\n* " + LIONE + "\n<references/>",
+    # template commentato e commento mai chiuso
+    "<!-- " + LIONE + " -->\n* {{Gemellaggio|DEU|Monaco di Baviera}}",
+    "<!-- elenco\n* " + LIONE,
+    # tag il cui contenuto non è wikitext
+    "<nowiki>" + LIONE + "</nowiki>",
+    "<gallery>\nx.jpg|" + LIONE + "\n</gallery>",
+    "<timeline>\n" + LIONE + "\n</timeline>",
+    "<graph>" + LIONE + "</graph>",
+    "<imagemap>\nx.jpg\n" + LIONE + "\n</imagemap>",
+    # tag il cui contenuto è wikitext
+    "<ref>" + LIONE + "</ref>",
+    "<poem>\n" + LIONE + "\n</poem>",
+    "<div>\n* " + LIONE + "\n</div>",
+    # nome del gemello scritto come link
+    "* {{Gemellaggio|ITA|San Cataldo (Italia){{!}}San Cataldo}}",
+]
+
+
+@pytest.mark.parametrize("wikitext", WIKITEXTS)
+def test_fast_matches_full(wikitext):
+    assert parse_gemellaggi(wikitext) == parse_gemellaggi(wikitext, fast=False)
+
+
+def test_gallery_uses_full_parse():
+    assert find_gemellaggi_templates("<gallery>\nx.jpg|" + LIONE + "\n</gallery>") is None
+    assert parse_gemellaggi("<gallery>\nx.jpg|" + LIONE + "\n</gallery>") == []
+
+
+def test_fast_scan_only_templates():
+    assert find_gemellaggi_templates("<ref>x</ref>\n* " + LIONE + "\n<references/>") == LIONE
+
+
+def test_link_target():
+    assert link_target("San Cataldo (Italia){{!}}San Cataldo") == "San Cataldo (Italia)"
+    assert link_target("[[Lione|Lyon]]") == "Lione"
+    assert link_target("Lione") == "Lione"
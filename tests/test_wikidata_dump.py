@@ -0,0 +1,61 @@
+# indice del dump Wikidata su un dump sintetico (tests/fixtures/wikidata_dump.json.bz2), senza rete:
+# Lione (Francia, Alvernia-Rodano-Alpi), Francia, Caledon (Canada, senza coordinate), Canada,
+# Alvernia-Rodano-Alpi senza pagina su itwiki e Q2000 senza pagina su itwiki e mai citato
+import os
+
+import pytest
+
+import wikidata_dump
+from wikidata_dump import DumpIndex
+
+DUMP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "wikidata_dump.json.bz2")
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = DumpIndex(str(tmp_path / "index.sqlite"))
+    yield index
+    index.conn.close()
+
+
+def get_qids(index):
+    return {qid for (qid,) in index.conn.execute("SELECT qid FROM entities")}
+
+
+def test_iter_dump():
+    assert [entity["id"] for entity in wikidata_dump.iter_dump(DUMP_PATH)] == ["Q456", "Q142", "Q18338206", "Q1000", "Q16", "Q2000"]
+
+
+def test_ingest(index):
+    # primo passaggio le 4 entità con pagina su itwiki, secondo passaggio la regione citata da P131
+    assert index.ingest(DUMP_PATH) == 5
+    assert get_qids(index) == {"Q456", "Q142", "Q1000", "Q16", "Q18338206"}
+
+
+def test_ingest_without_labels_pass(index):
+    assert index.ingest(DUMP_PATH, labels_pass=False) == 4
+    assert "Q18338206" not in get_qids(index)
+    assert index.get_claims(["Q456"]) == {"Q456": ("Francia", "")}
+
+
+def test_ingest_twice(index):
+    index.ingest(DUMP_PATH)
+    assert index.ingest(DUMP_PATH) == 5
+
+
+def test_get_page(index):
+    index.ingest(DUMP_PATH)
+    assert index.get_page("Lione") == {"title": "Lione", "missing": False, "lat": 45.76, "lon": 4.84, "found_coords": True,
+                                       "qid": "Q456", "disambiguation": False, "revid": None, "wikitext": None}
+    page = index.get_page("Caledon (Ontario)")
+    assert (page["qid"], page["lat"], page["lon"], page["found_coords"]) == ("Q1000", None, None, False)
+    # solo per titolo itwiki, non per etichetta
+    assert index.get_page("Caledon") is None
+    assert index.get_page("Alvernia-Rodano-Alpi") is None
+
+
+def test_get_claims(index):
+    index.ingest(DUMP_PATH)
+    claims = index.get_claims(["Q456", "Q1000", "Q16", "Q456", "Q9999"])
+    # etichette in italiano; i qid non indicizzati mancano, così il crawler li chiede all'API
+    assert claims == {"Q456": ("Francia", "Alvernia-Rodano-Alpi"), "Q1000": ("Canada", ""), "Q16": ("", "")}
@@ -0,0 +1,108 @@
+import json
+import math
+import os
+import shutil
+
+
+# le tile sono quelle di Leaflet/OpenStreetMap (Web Mercator) a un solo livello di zoom
+TILE_ZOOM = 6
+# sotto questo zoom la mappa mostra solo la panoramica aggregata
+DETAIL_ZOOM = 5
+# coordinate intere: gradi * 10^PRECISION (4 cifre ~ 11 m, 2 cifre ~ 1 km)
+PRECISION = 4
+OVERVIEW_PRECISION = 2
+
+
+def get_tile(lat, lon, zoom=TILE_ZOOM):
+    n = 2 ** zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def quantize(value, precision):
+    return None if value is None else round(value * 10 ** precision)
+
+
+class NameTable:
+    # i nomi ripetuti (stati, regioni, gemelli comuni a più comuni) sono scritti una volta sola per file
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def get_id(self, name):
+        name = name or ""
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+
+def is_found(gemello):
+    # stesso criterio del CSV: senza coordinate o claims il gemello non ha un arco sulla mappa
+    return bool(gemello.found_coords and gemello.found_claims)
+
+
+def get_tiles(records):
+    # tile -> [Comune], un comune nella tile in cui cade
+    tiles = {}
+    for start in records:
+        if start.lat is None or start.lon is None or not any(is_found(g) for g in start.gemelli):
+            continue
+        tiles.setdefault(get_tile(start.lat, start.lon), []).append(start)
+    return tiles
+
+
+def encode_tile(comuni):
+    # [nome, regione, lat, lon, [[nome, stato, lat, lon], ...]], nomi come indici in "names"
+    names = NameTable()
+    rows = []
+    for start in comuni:
+        twins = []
+        for gemello in start.gemelli:
+            found = is_found(gemello)
+            twins.append([names.get_id(gemello.comune), names.get_id(gemello.stato),
+                          quantize(gemello.lat, PRECISION) if found else None,
+                          quantize(gemello.lon, PRECISION) if found else None])
+        rows.append([names.get_id(start.comune), names.get_id(start.regione),
+                     quantize(start.lat, PRECISION), quantize(start.lon, PRECISION), twins])
+    return {"names": names.names, "comuni": rows}
+
+
+def encode_overview(tiles):
+    # un punto per comune con il numero di gemelli: basta per lo zoom mondiale
+    names = NameTable()
+    rows = []
+    for comuni in tiles.values():
+        for start in comuni:
+            rows.append([names.get_id(start.comune), quantize(start.lat, OVERVIEW_PRECISION),
+                         quantize(start.lon, OVERVIEW_PRECISION), sum(1 for g in start.gemelli if is_found(g))])
+    return {"names": names.names, "comuni": rows}
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def export_tiles(records, output_dir):
+    # la cartella viene rigenerata da zero: nessuna tile vecchia resta indietro
+    tiles = get_tiles(records)
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+    index = {}
+    for (x, y), comuni in tiles.items():
+        os.makedirs(os.path.join(output_dir, str(TILE_ZOOM), str(x)), exist_ok=True)
+        write_json(os.path.join(output_dir, str(TILE_ZOOM), str(x), f"{y}.json"), encode_tile(comuni))
+        index[f"{x}/{y}"] = len(comuni)
+    write_json(os.path.join(output_dir, "overview.json"), encode_overview(tiles))
+    write_json(os.path.join(output_dir, "index.json"), {
+        "zoom": TILE_ZOOM,
+        "detail_zoom": DETAIL_ZOOM,
+        "precision": PRECISION,
+        "overview_precision": OVERVIEW_PRECISION,
+        "tiles": dict(sorted(index.items())),
+    })
+    return len(index), sum(index.values())
@@ -0,0 +1 @@
+# comandi da riga di comando: python -m twinings <comando> --help (vedi cli.py)
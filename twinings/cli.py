@@ -0,0 +1,214 @@
+import argparse
+import string
+import sys
+
+
+# percorsi di default, relativi alla root del repository
+RESULTS_DIR = "results"
+RESULTS = "results/result_*.jsonl"
+PROVINCE = "results/province.json"
+DB = "db/twinings.db"
+REPORTS_DIR = "docs/reports"
+CSV = "docs/data/twinings.csv"
+FAILS_CSV = "docs/data/twinings_fails.csv"
+TILES_DIR = "docs/data/tiles"
+HTTP_CACHE = "cache/http.sqlite"
+# stessi nomi di geodistance.DISTANCE_FUNCTIONS, qui per non importare numpy solo per --help
+DISTANCE_MODES = ("ellipsoidal", "haversine", "geopy")
+
+
+# ogni comando importa solo i moduli che gli servono: requests, mwparserfromhell, numpy e geopy
+# vengono caricati solo da crawl, load-db e repair
+
+def configure_http(args):
+    import httpcache
+    import wikiclient
+
+    httpcache.CACHE_PATH = args.cache_path
+    httpcache.OFFLINE = args.offline
+    for name in ("concurrency", "rate"):
+        for host, value in getattr(args, name):
+            hosts = [host] if host else list(wikiclient.HOST_LIMITS)
+            for host in hosts:
+                wikiclient.configure_host(host, **{name: value})
+
+
+def crawl(args):
+    import logging
+
+    import crawler
+    import httpcache
+    import metrics
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(message)s")
+    configure_http(args)
+    crawler.TRACE_PATH = args.trace
+    if args.workers:
+        crawler.WORKERS = args.workers
+    crawler.USE_WIKIDATA_DUMP = args.wikidata_dump
+    metrics.open_trace(args.trace)
+    if args.incremental:
+        # le revisioni devono essere quelle attuali, non quelle in cache
+        httpcache.TTL["info"] = 0
+
+    # i comuni già nel journal di un run interrotto vengono saltati: per riprendere basta rilanciare
+    crawler.crawl([lettera.upper() for lettera in args.lettere], args.incremental, args.processes, args.results_dir, args.restart)
+
+    print(metrics.summary())
+    print(f"Titoli risolti: {dict(crawler.RESOLUTION_STATS)}")
+
+
+def load_db(args):
+    import sqlite3
+
+    from dbload import load_db
+
+    conn = sqlite3.connect(args.db)
+    load_db(conn, args.results, args.province, args.distance_mode, args.normalized)
+    conn.close()
+    if args.reports:
+        reports(args)
+
+
+def reports(args):
+    from reports import REPORTS, TEMP_REPORTS, run_reports
+
+    run_reports(args.db, args.output, REPORTS, args.workers, args.force)
+    if args.temp:
+        print()
+        print("-" * 80)
+        print("TEMP QUERY")
+        print("-" * 80)
+        print()
+        run_reports(args.db, args.output, TEMP_REPORTS, args.workers, args.force)
+
+
+def get_records(args):
+    from csvexport import iter_records_from_db, iter_records_from_results
+
+    return iter_records_from_db(args.db) if args.source == "db" else iter_records_from_results(args.results)
+
+
+def export_csv(args):
+    from csvexport import export_csv, iter_rows_from_db, iter_rows_from_results
+
+    rows = iter_rows_from_db(args.db) if args.source == "db" else iter_rows_from_results(args.results)
+    count, count_fails = export_csv(rows, args.output, args.fails_output, args.gzip, args.parquet)
+    print(f"CSV generato: {args.output} ({count} righe)")
+    print(f"CSV fails generato: {args.fails_output} ({count_fails} righe)")
+
+
+def tiles(args):
+    from tileexport import export_tiles
+
+    count_tiles, count_comuni = export_tiles(get_records(args), args.output)
+    print(f"Tile generate: {args.output} ({count_tiles} tile, {count_comuni} comuni)")
+
+
+def repair(args):
+    import metrics
+    from repair import repair_db, repair_results
+
+    configure_http(args)
+    if args.source == "db":
+        count, repaired = repair_db(args.db, args.distance_mode)
+    else:
+        count, repaired = repair_results(args.results)
+    print(metrics.summary())
+    print(f"Gemelli senza stato o coordinate: {count}, corretti: {repaired}")
+
+
+def add_source_arguments(parser):
+    parser.add_argument("--source", choices=("results", "db"), default="results", help="legge i result_*.jsonl o il db")
+    parser.add_argument("--results", default=RESULTS, help="pattern dei file result")
+    parser.add_argument("--db", default=DB)
+
+
+def host_limit(cast):
+    # "N" vale per tutti gli host di wikiclient.HOST_LIMITS, "host=N" solo per quello
+    def parse(value):
+        host, _, number = value.rpartition("=")
+        try:
+            return host or None, cast(number)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"atteso N o host=N, non {value!r}")
+    return parse
+
+
+def add_http_arguments(parser):
+    parser.add_argument("--cache-path", default=HTTP_CACHE, help="cache SQLite delle risposte MediaWiki/Wikidata")
+    parser.add_argument("--offline", action="store_true", help="solo risposte già in cache, mai in rete")
+    parser.add_argument("--concurrency", type=host_limit(int), action="append", default=[], metavar="[HOST=]N",
+                        help="richieste contemporanee per host (ripetibile, default in wikiclient.HOST_LIMITS)")
+    parser.add_argument("--rate", type=host_limit(float), action="append", default=[], metavar="[HOST=]N",
+                        help="richieste al secondo per host (ripetibile, default in wikiclient.HOST_LIMITS)")
+
+
+def add_reports_arguments(parser):
+    parser.add_argument("--output", default=REPORTS_DIR, help="cartella dei report html")
+    parser.add_argument("--workers", type=int, default=4, help="report eseguiti in parallelo")
+    parser.add_argument("--force", action="store_true", help="rigenera anche i report già aggiornati per il db attuale")
+    parser.add_argument("--no-temp", action="store_false", dest="temp", help="salta le query di controllo (TEMP_REPORTS)")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog="python -m twinings", description="Gemellaggi dei comuni italiani da Wikipedia")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("crawl", help="scarica i gemellaggi in result_<lettera>.jsonl")
+    command.add_argument("lettere", nargs="*", default=list(string.ascii_uppercase), help="lettere da elaborare (default: A-Z)")
+    command.add_argument("-p", "--processes", type=int, default=1, help="processi worker")
+    command.add_argument("--workers", type=int, help="thread per processo (default crawler.WORKERS)")
+    command.add_argument("--results-dir", default=RESULTS_DIR, help="cartella dei result_<lettera>.jsonl")
+    command.add_argument("--incremental", action="store_true", help="solo comuni nuovi o con la pagina cambiata")
+    command.add_argument("--restart", action="store_true", help="scarta il journal di un run interrotto e riparte da zero")
+    command.add_argument("--wikidata-dump", action="store_true", help="coordinate, stato e regione dall'indice del dump Wikidata")
+    command.add_argument("-v", "--verbose", action="store_true", help="stampa i dati di ogni comune")
+    command.add_argument("--trace", help="file JSONL con i tempi di ogni fase")
+    add_http_arguments(command)
+    command.set_defaults(func=crawl)
+
+    command = commands.add_parser("load-db", help="carica i result nel db SQLite")
+    command.add_argument("--results", default=RESULTS, help="pattern dei file result")
+    command.add_argument("--province", default=PROVINCE)
+    command.add_argument("--db", default=DB)
+    command.add_argument("--distance-mode", choices=DISTANCE_MODES, default="ellipsoidal")
+    command.add_argument("--normalized", action="store_true", help="places + twinnings al posto della tabella twins")
+    command.add_argument("--reports", action="store_true", help="dopo il caricamento genera anche i report")
+    add_reports_arguments(command)
+    command.set_defaults(func=load_db)
+
+    command = commands.add_parser("reports", help="genera i report html dal db")
+    command.add_argument("--db", default=DB)
+    add_reports_arguments(command)
+    command.set_defaults(func=reports)
+
+    command = commands.add_parser("export-csv", help="genera i CSV per la mappa")
+    add_source_arguments(command)
+    command.add_argument("--output", default=CSV)
+    command.add_argument("--fails-output", default=FAILS_CSV, help="CSV dei gemelli senza coordinate")
+    command.add_argument("--gzip", action="store_true", help="anche le copie .csv.gz")
+    command.add_argument("--parquet", action="store_true", help="anche le copie .parquet (richiede pyarrow)")
+    command.set_defaults(func=export_csv)
+
+    command = commands.add_parser("tiles", help="genera le tile JSON per la mappa")
+    add_source_arguments(command)
+    command.add_argument("--output", default=TILES_DIR)
+    command.set_defaults(func=tiles)
+
+    command = commands.add_parser("repair", help="corregge i gemelli senza stato o coordinate")
+    add_source_arguments(command)
+    command.add_argument("--distance-mode", choices=DISTANCE_MODES, default="ellipsoidal")
+    add_http_arguments(command)
+    command.set_defaults(func=repair)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+import multiprocessing
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import httpcache
+import metrics
+
+
+HEADERS = {
+    "User-Agent": "MyWikiApp/1.0 (https://example.com; myemail@example.com)",
+    "Accept-Encoding": "gzip, deflate",
+}
+TIMEOUT = 10
+
+# nuovi tentativi su 429/5xx/maxlag con backoff esponenziale e jitter, rispettando Retry-After
+MAX_RETRIES = 5
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
+MAXLAG = 5
+
+# limiti per host: richieste contemporanee e richieste al secondo (token bucket)
+HOST_LIMITS = {
+    "it.wikipedia.org": {"concurrency": 4, "rate": 10.0, "burst": 10},
+    "www.wikidata.org": {"concurrency": 4, "rate": 10.0, "burst": 10},
+}
+DEFAULT_LIMIT = {"concurrency": 2, "rate": 5.0, "burst": 5}
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostThrottle:
+    def __init__(self, concurrency, rate, burst):
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        self.bucket.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
+
+
+class SharedTokenBucket(TokenBucket):
+    # come TokenBucket, con lo stato in memoria condivisa: un solo budget per tutti i processi del crawl
+    def __init__(self, rate, burst, context=multiprocessing):
+        self.rate = rate
+        self.capacity = burst
+        self.state = context.Array("d", [burst, time.monotonic()])
+
+    def acquire(self):
+        while True:
+            with self.state.get_lock():
+                now = time.monotonic()
+                tokens = min(self.capacity, self.state[0] + (now - self.state[1]) * self.rate)
+                self.state[1] = now
+                if tokens >= 1:
+                    self.state[0] = tokens - 1
+                    return
+                self.state[0] = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedHostThrottle(HostThrottle):
+    def __init__(self, concurrency, rate, burst, context=multiprocessing):
+        self.semaphore = context.BoundedSemaphore(concurrency)
+        self.bucket = SharedTokenBucket(rate, burst, context)
+
+
+_throttles = {}
+_throttles_lock = threading.Lock()
+
+
+def configure_host(host, concurrency=None, rate=None, burst=None):
+    limit = dict(HOST_LIMITS.get(host, DEFAULT_LIMIT))
+    if concurrency is not None:
+        limit["concurrency"] = concurrency
+    if rate is not None:
+        limit["rate"] = rate
+    if burst is not None:
+        limit["burst"] = burst
+    HOST_LIMITS[host] = limit
+    with _throttles_lock:
+        _throttles.pop(host, None)
+
+
+def get_throttle(host):
+    with _throttles_lock:
+        throttle = _throttles.get(host)
+        if throttle is None:
+            limit = HOST_LIMITS.get(host, DEFAULT_LIMIT)
+            throttle = HostThrottle(limit["concurrency"], limit["rate"], limit["burst"])
+            _throttles[host] = throttle
+        return throttle
+
+
+def create_shared_throttles(context=multiprocessing):
+    # da creare nel processo padre e passare ai processi worker (install_throttles) alla loro creazione
+    return {host: SharedHostThrottle(limit["concurrency"], limit["rate"], limit["burst"], context)
+            for host, limit in HOST_LIMITS.items()}
+
+
+def install_throttles(throttles):
+    with _throttles_lock:
+        _throttles.update(throttles)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # connessioni keep-alive condivise tra i thread, un pool per host
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = max(limit["concurrency"] for limit in [DEFAULT_LIMIT, *HOST_LIMITS.values()])
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=len(HOST_LIMITS) + 1, pool_maxsize=pool_size)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def get_retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def get_backoff(attempt, retry_after=None):
+    delay = min(MAX_BACKOFF, BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.0)
+    return max(delay, retry_after or 0.0)
+
+
+def get_endpoint(host, params):
+    return f"{host} {httpcache.request_kind(params)}"
+
+
+def get_cached_items(url, params, param, values):
+    # {valore: dato} dei titoli o id già in cache, per le richieste batch che uniscono i valori in params[param]
+    store = httpcache.get_cache()
+    if store is None:
+        return {}
+    found = store.get_many(url, params, param, values)
+    endpoint = get_endpoint(urlsplit(url).hostname, params)
+    for value in values:
+        metrics.record_cache(endpoint, value in found)
+    return found
+
+
+def put_cached_items(url, params, param, items):
+    store = httpcache.get_cache()
+    if store is not None and items:
+        store.put_many(url, params, param, items)
+
+
+def get_json(url, params=None, cache=True):
+    host = urlsplit(url).hostname
+    endpoint = get_endpoint(host, params)
+    store = httpcache.get_cache() if cache else None
+    if store is not None:
+        data = store.get(url, params)
+        metrics.record_cache(endpoint, data is not None)
+        if data is not None:
+            return data
+    if httpcache.OFFLINE:
+        raise httpcache.CacheMiss(f"{url} {params}")
+
+    request_params = dict(params or {})
+    if "action" in request_params and MAXLAG:
+        request_params["maxlag"] = MAXLAG
+
+    for attempt in range(MAX_RETRIES + 1):
+        last = attempt == MAX_RETRIES
+        start = time.monotonic()
+        retry_after = None
+        try:
+            with get_throttle(host):
+                r = get_session().get(url, params=request_params, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            metrics.record(endpoint, time.monotonic() - start, error=True, retry=not last)
+            if last:
+                raise
+        else:
+            if r.status_code in RETRY_STATUS and not last:
+                metrics.record(endpoint, time.monotonic() - start, len(r.content), error=True, retry=True)
+                retry_after = get_retry_after(r)
+            else:
+                r.raise_for_status()
+                data = r.json()
+                lagged = data.get("error", {}).get("code") == "maxlag"
+                metrics.record(endpoint, time.monotonic() - start, len(r.content), error=lagged, retry=lagged and not last)
+                if not lagged:
+                    break
+                if last:
+                    raise requests.HTTPError(f"maxlag: {data['error'].get('info', '')}", response=r)
+                retry_after = get_retry_after(r) or MAXLAG
+        time.sleep(get_backoff(attempt, retry_after))
+
+    if store is not None and "error" not in data:
+        store.put(url, params, data)
+    return data
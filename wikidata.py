@@ -0,0 +1,77 @@
+from mediawiki import chunks
+from wikiclient import get_cached_items, get_json, put_cached_items
+
+
+WIKIDATA_API = "https://www.wikidata.org/w/api.php"
+# massimo numero di id per wbgetentities (utenti non bot)
+BATCH_SIZE = 50
+LANGUAGE = "it"
+
+# etichetta italiana per QID: "Italia", "Germania", "provincia di Padova"... vengono scaricate una volta per run
+LABEL_CACHE = {}
+
+
+def get_entities(ids, props=("claims", "labels"), languages=(LANGUAGE,)):
+    # in cache un elemento per QID: in rete vanno solo quelli mancanti
+    entities = {}
+    unique_ids = list(dict.fromkeys(i for i in ids if i))
+    params = {
+        "action": "wbgetentities",
+        "props": "|".join(props),
+        "languages": "|".join(languages),
+        "format": "json"
+    }
+    for chunk in chunks(unique_ids, BATCH_SIZE):
+        found = get_cached_items(WIKIDATA_API, params, "ids", chunk)
+        missing = [qid for qid in chunk if qid not in found]
+        if missing:
+            data = get_json(WIKIDATA_API, {**params, "ids": "|".join(missing)}, cache=False)
+            fetched = data.get("entities", {})
+            if "error" not in data:
+                put_cached_items(WIKIDATA_API, params, "ids", fetched)
+            found.update(fetched)
+        for qid, entity in found.items():
+            entities[qid] = entity
+            if "labels" in props and "missing" not in entity:
+                label = entity.get("labels", {}).get(LANGUAGE)
+                LABEL_CACHE[qid] = label["value"] if label else ""
+    return entities
+
+
+def get_labels(qids):
+    missing = [qid for qid in qids if qid and qid not in LABEL_CACHE]
+    if missing:
+        get_entities(missing, props=("labels",))
+    return {qid: LABEL_CACHE.get(qid, "") for qid in qids if qid}
+
+
+def get_claim_target(claims, prop_id):
+    try:
+        return claims[prop_id][0]["mainsnak"]["datavalue"]["value"]["id"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def get_claims(qids):
+    # {qid: (stato, regione)} leggendo P17 (Stato) e P131 (regione / entità superiore)
+    entities = get_entities(qids, props=("claims",))
+    targets = {}
+    for qid in qids:
+        claims = entities.get(qid, {}).get("claims", {})
+        targets[qid] = (get_claim_target(claims, "P17"), get_claim_target(claims, "P131"))
+    labels = get_labels([target for pair in targets.values() for target in pair])
+    return {qid: (labels.get(stato, ""), labels.get(regione, "")) for qid, (stato, regione) in targets.items()}
+
+
+def get_claim_coordinates(claims):
+    try:
+        value = claims["P625"][0]["mainsnak"]["datavalue"]["value"]
+        return value["latitude"], value["longitude"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def get_coordinates(qids):
+    # {qid: (lat, lon)} da P625 (coordinate geografiche), None se l'elemento non le ha
+    entities = get_entities(qids, props=("claims",))
+    return {qid: get_claim_coordinates(entities.get(qid, {}).get("claims", {})) for qid in qids}
@@ -0,0 +1,152 @@
+import bz2
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+
+# dump JSON di Wikidata (https://dumps.wikimedia.org/wikidatawiki/entities/), anche .bz2 o .gz
+DUMP_PATH = "latest-all.json.bz2"
+INDEX_PATH = "cache/wikidata_index.sqlite"
+SITE = "itwiki"
+LANGUAGE = "it"
+INSERT_BATCH = 10000
+
+
+def open_dump(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_dump(path):
+    # il dump è un array JSON con un'entità per riga: basta leggere riga per riga
+    with open_dump(path) as f:
+        for line in f:
+            line = line.strip().rstrip(",")
+            if not line or line in ("[", "]"):
+                continue
+            yield json.loads(line)
+
+
+def get_claim_value(claims, prop_id):
+    try:
+        return claims[prop_id][0]["mainsnak"]["datavalue"]["value"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def entity_row(entity):
+    claims = entity.get("claims", {})
+    coords = get_claim_value(claims, "P625")
+    stato = get_claim_value(claims, "P17")
+    regione = get_claim_value(claims, "P131")
+    label = entity.get("labels", {}).get(LANGUAGE)
+    sitelink = entity.get("sitelinks", {}).get(SITE)
+    return (
+        entity["id"],
+        sitelink["title"] if sitelink else None,
+        coords["latitude"] if isinstance(coords, dict) else None,
+        coords["longitude"] if isinstance(coords, dict) else None,
+        stato["id"] if isinstance(stato, dict) else None,
+        regione["id"] if isinstance(regione, dict) else None,
+        label["value"] if label else "",
+    )
+
+
+class DumpIndex:
+    # indice compatto (qid, titolo itwiki, P625, P17, P131, etichetta it) estratto dal dump
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entities (qid TEXT PRIMARY KEY,
+            title TEXT,
+            lat REAL,
+            lon REAL,
+            p17 TEXT,
+            p131 TEXT,
+            label TEXT)
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entities_title ON entities (title)")
+
+    def _insert(self, rows):
+        self.conn.executemany("INSERT OR REPLACE INTO entities (qid, title, lat, lon, p17, p131, label) VALUES(?, ?, ?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+    def ingest(self, dump_path, labels_pass=True):
+        # primo passaggio: solo le entità con una pagina su itwiki
+        rows = []
+        for entity in iter_dump(dump_path):
+            if SITE not in entity.get("sitelinks", {}):
+                continue
+            rows.append(entity_row(entity))
+            if len(rows) >= INSERT_BATCH:
+                self._insert(rows)
+                rows = []
+        self._insert(rows)
+
+        # secondo passaggio (se serve): etichette di stati/regioni senza pagina su itwiki
+        missing = {qid for (qid,) in self.conn.execute("""
+            SELECT p17 FROM entities WHERE p17 IS NOT NULL UNION SELECT p131 FROM entities WHERE p131 IS NOT NULL
+            EXCEPT SELECT qid FROM entities
+        """)}
+        if labels_pass and missing:
+            rows = []
+            for entity in iter_dump(dump_path):
+                if entity.get("id") in missing:
+                    rows.append(entity_row(entity))
+                    if len(rows) >= INSERT_BATCH:
+                        self._insert(rows)
+                        rows = []
+            self._insert(rows)
+        return self.conn.execute("SELECT count(*) FROM entities").fetchone()[0]
+
+    def get_page(self, title):
+        # stessa forma di mediawiki.page_info, senza wikitext
+        with self.lock:
+            row = self.conn.execute("SELECT qid, lat, lon FROM entities WHERE title = ?", (title,)).fetchone()
+        if row is None:
+            return None
+        qid, lat, lon = row
+        return {"title": title, "missing": False, "lat": lat, "lon": lon, "found_coords": lat is not None,
+                "qid": qid, "disambiguation": False, "revid": None, "wikitext": None}
+
+    def get_claims(self, qids):
+        # {qid: (stato, regione)} come wikidata.get_claims, solo per i qid presenti nell'indice
+        claims = {}
+        with self.lock:
+            for qid in dict.fromkeys(qids):
+                row = self.conn.execute("""SELECT S.label, R.label FROM entities E
+                    LEFT JOIN entities S ON S.qid = E.p17
+                    LEFT JOIN entities R ON R.qid = E.p131
+                    WHERE E.qid = ?""", (qid,)).fetchone()
+                if row is not None:
+                    claims[qid] = (row[0] or "", row[1] or "")
+        return claims
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_dump_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            if not os.path.exists(INDEX_PATH):
+                raise FileNotFoundError(f"indice Wikidata non trovato: {INDEX_PATH}, lancia wikidata_dump.py")
+            _index = DumpIndex(INDEX_PATH)
+        return _index
+
+
+if __name__ == "__main__":
+    dump_path = sys.argv[1] if len(sys.argv) > 1 else DUMP_PATH
+    count = DumpIndex(INDEX_PATH).ingest(dump_path)
+    print(f"Indice generato: {INDEX_PATH} ({count} entità)")